@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark del motor de renombrado concurrente
+Simula un sistema de archivos de alta latencia (SMB/NFS) envolviendo
+el renombrado del núcleo con un retardo artificial, y compara el rendimiento con
+distintas cantidades de hilos
+Uso: python benchmarks/bench_rename_threads.py [--folders N] [--latency MS] [--workers 1 4 8]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rename_folders_core
+from rename_folders_core import STATUS_RENAME, apply_renames, iter_plan_rows
+
+def make_tree(base, folders, subfolders):
+    """Crea carpetas con nombres sin normalizar (y subcarpetas opcionales)"""
+    for i in range(folders):
+        folder = os.path.join(base, f"Carpeta Número {i}")
+        os.mkdir(folder)
+        for j in range(subfolders):
+            os.mkdir(os.path.join(folder, f"Sub Carpeta {j}"))
+
+def delayed_rename(latency):
+    """Devuelve un rename_noreplace que espera 'latency' segundos antes de renombrar"""
+    real_rename = rename_folders_core.rename_noreplace
+
+    def rename(src, dst, *args, **kwargs):
+        time.sleep(latency)
+        return real_rename(src, dst, *args, **kwargs)
+
+    return rename
+
+def run(base, workers, recursive):
+    """Planifica y aplica el renombrado; devuelve (renombradas, errores, segundos)"""
+    rows = (item for item in iter_plan_rows(base, None, None, recursive)
+            if item['status'] == STATUS_RENAME)
+    start = time.perf_counter()
+    renamed = errors = 0
+    for _, error in apply_renames(rows, workers):
+        if error is None:
+            renamed += 1
+        else:
+            errors += 1
+    return renamed, errors, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de renombrado con hilos")
+    parser.add_argument("--folders", type=int, default=200, help="Carpetas de primer nivel")
+    parser.add_argument("--subfolders", type=int, default=0, help="Subcarpetas por carpeta (activa el modo recursivo)")
+    parser.add_argument("--latency", type=float, default=5.0, help="Retardo por renombrado en ms")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    recursive = args.subfolders > 0
+    real_rename = rename_folders_core.rename_noreplace
+    rename_folders_core.rename_noreplace = delayed_rename(args.latency / 1000)
+    results = {}
+    try:
+        for workers in args.workers:
+            base = tempfile.mkdtemp(prefix="bench_rename_")
+            try:
+                make_tree(base, args.folders, args.subfolders)
+                renamed, errors, elapsed = run(base, workers, recursive)
+            finally:
+                shutil.rmtree(base, ignore_errors=True)
+            results[workers] = elapsed
+            print(f"{workers:3d} hilos: {renamed} renombradas, {errors} errores en "
+                  f"{elapsed:6.2f} s ({renamed / elapsed:8.1f} renombrados/s)")
+    finally:
+        rename_folders_core.rename_noreplace = real_rename
+
+    baseline = results.get(1)
+    if baseline:
+        for workers, elapsed in results.items():
+            if workers != 1:
+                print(f"Aceleración con {workers} hilos: x{baseline / elapsed:.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
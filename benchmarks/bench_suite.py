@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suite de benchmarks del núcleo de renombrado
+Genera un árbol sintético (anchura, profundidad, proporción de acentos,
+espacios, símbolos y colisiones configurables) en un directorio temporal
+(o en un tmpfs con --tmpdir /dev/shm) y mide:
+  - normalización: nombres/s con normalize_many
+  - escaneo: entradas/s con iter_listings recursivo
+  - vista previa: filas/s con iter_plan_rows recursivo
+  - renombrado: renombrados/s con apply_renames
+Los resultados se emiten como JSON y pueden compararse con una línea base;
+el script termina con código 1 si alguna métrica empeora más que la tolerancia.
+Uso: python benchmarks/bench_suite.py [--breadth N] [--depth D] [--output res.json]
+                                      [--baseline base.json] [--tolerance 0.15]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rename_folders_core import (
+    STATUS_RENAME,
+    apply_renames,
+    iter_listings,
+    iter_plan_rows,
+    normalize_many,
+)
+
+RESULTS_FORMAT_VERSION = 1
+
+# Métricas comparables con la línea base: todas son "más alto es mejor"
+METRIC_LABELS = {
+    'normalize_names_per_s': "Normalización",
+    'scan_entries_per_s': "Escaneo",
+    'preview_rows_per_s': "Vista previa",
+    'rename_per_s': "Renombrado",
+}
+
+PLAIN_WORDS = ["Musica", "Fotos", "Docs", "Backup", "Proyecto", "Cliente", "Informe",
+               "Rock", "Live", "Video", "Archivo", "Datos", "Vacaciones", "Trabajo"]
+ACCENTED_WORDS = ["Música", "Canción", "Películas", "Año", "Niños", "Diseño", "Código",
+                  "Coração", "Férias", "Été", "Élève", "Bibliothèque", "Garçon", "Œuvres"]
+SYMBOLS = ["&", "(1)", "!", "#", "@", "+", "[HD]", "-", "'", ","]
+
+def make_name(rng, config):
+    """Genera un nombre de carpeta según las proporciones de la configuración"""
+    words = []
+    for _ in range(rng.randint(1, 4)):
+        pool = ACCENTED_WORDS if rng.random() < config['accents'] else PLAIN_WORDS
+        words.append(rng.choice(pool))
+    if rng.random() < config['symbols']:
+        words.insert(rng.randint(0, len(words)), rng.choice(SYMBOLS))
+    words.append(str(rng.randint(1, 9999)))
+    separator = " " if rng.random() < config['spaces'] else "_"
+    return separator.join(words)
+
+def make_sibling_names(rng, config):
+    """
+    Nombres únicos de un directorio. Con probabilidad config['collisions']
+    un nombre es una variante (mayúsculas/espacios) de un hermano anterior,
+    de modo que ambos colisionan tras normalizar.
+    """
+    names = []
+    used = set()
+    while len(names) < config['breadth']:
+        if names and rng.random() < config['collisions']:
+            name = rng.choice(names).upper().replace("_", " ")
+        else:
+            name = make_name(rng, config)
+        if name not in used:
+            used.add(name)
+            names.append(name)
+    return names
+
+def make_tree(base, config):
+    """Crea el árbol sintético y devuelve la cantidad de carpetas creadas"""
+    rng = random.Random(config['seed'])
+    created = 0
+    level = [base]
+    for _ in range(config['depth']):
+        next_level = []
+        for parent in level:
+            for name in make_sibling_names(rng, config):
+                path = os.path.join(parent, name)
+                os.mkdir(path)
+                next_level.append(path)
+                created += 1
+        level = next_level
+    return created
+
+def best_of(function, repeat):
+    """Ejecuta function repeat veces y devuelve (mejor tiempo, último resultado)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def bench_normalize(config):
+    """Nombres por segundo normalizando un corpus sintético en lote"""
+    rng = random.Random(config['seed'])
+    corpus = [make_name(rng, config) for _ in range(config['names'])]
+    elapsed, _ = best_of(lambda: normalize_many(corpus), config['repeat'])
+    return {'names': len(corpus), 'seconds': elapsed}, len(corpus) / elapsed
+
+def bench_scan(base, config):
+    """Entradas por segundo listando el árbol completo"""
+    def scan():
+        return sum(len(entries) for _, _, entries in iter_listings(base, recursive=True))
+    elapsed, entries = best_of(scan, config['repeat'])
+    return {'entries': entries, 'seconds': elapsed}, entries / elapsed
+
+def bench_preview(base, config):
+    """Filas por segundo generando la vista previa recursiva"""
+    def preview():
+        stats = {}
+        for _ in iter_plan_rows(base, None, stats, True):
+            pass
+        return stats
+    elapsed, stats = best_of(preview, config['repeat'])
+    details = {'rows': stats.get('total', 0), 'changes': stats.get('changes', 0),
+               'conflicts': stats.get('conflicts', 0), 'seconds': elapsed}
+    return details, details['rows'] / elapsed
+
+def bench_rename(config):
+    """
+    Renombrados por segundo aplicando el plan. Cada repetición necesita un
+    árbol nuevo (el anterior ya quedó renombrado); la creación no se mide.
+    """
+    best = None
+    renamed = errors = 0
+    for _ in range(config['repeat']):
+        base = tempfile.mkdtemp(prefix="bench_suite_", dir=config['tmpdir'])
+        try:
+            make_tree(base, config)
+            rows = [item for item in iter_plan_rows(base, None, None, True)
+                    if item['status'] == STATUS_RENAME]
+            renamed = errors = 0
+            start = time.perf_counter()
+            for _, error in apply_renames(rows, config['workers']):
+                if error is None:
+                    renamed += 1
+                else:
+                    errors += 1
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+        if best is None or elapsed < best:
+            best = elapsed
+    rate = renamed / best if best else 0.0
+    return {'renamed': renamed, 'errors': errors, 'seconds': best}, rate
+
+def run_suite(config):
+    """Ejecuta todas las mediciones y devuelve el diccionario de resultados"""
+    details = {}
+    metrics = {}
+    details['normalize'], metrics['normalize_names_per_s'] = bench_normalize(config)
+
+    base = tempfile.mkdtemp(prefix="bench_suite_", dir=config['tmpdir'])
+    try:
+        details['folders'] = make_tree(base, config)
+        details['scan'], metrics['scan_entries_per_s'] = bench_scan(base, config)
+        details['preview'], metrics['preview_rows_per_s'] = bench_preview(base, config)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    details['rename'], metrics['rename_per_s'] = bench_rename(config)
+    return {
+        'version': RESULTS_FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'metrics': metrics,
+        'details': details,
+    }
+
+def compare_with_baseline(metrics, baseline, tolerance):
+    """
+    Compara las métricas con las de la línea base.
+    Devuelve la lista de (métrica, actual, base) que empeoraron más que tolerance.
+    """
+    regressions = []
+    for key, label in METRIC_LABELS.items():
+        previous = baseline.get('metrics', {}).get(key)
+        current = metrics.get(key)
+        if not previous or current is None:
+            continue
+        change = current / previous - 1
+        mark = "❌" if change < -tolerance else "✅"
+        print(f"{mark} {label:<14} {current:12,.0f}/s  base {previous:12,.0f}/s  ({change:+.1%})",
+              file=sys.stderr)
+        if change < -tolerance:
+            regressions.append((key, current, previous))
+    return regressions
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de benchmarks del renombrador")
+    parser.add_argument("--breadth", type=int, default=10, help="Carpetas por directorio")
+    parser.add_argument("--depth", type=int, default=3, help="Niveles del árbol")
+    parser.add_argument("--accents", type=float, default=0.4, help="Proporción de palabras con acentos")
+    parser.add_argument("--spaces", type=float, default=0.7, help="Proporción de nombres con espacios")
+    parser.add_argument("--symbols", type=float, default=0.3, help="Proporción de nombres con símbolos")
+    parser.add_argument("--collisions", type=float, default=0.05,
+                        help="Proporción de nombres que colisionan con un hermano al normalizar")
+    parser.add_argument("--names", type=int, default=50000, help="Nombres para medir la normalización")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por medición (se toma la mejor)")
+    parser.add_argument("--workers", type=int, default=1, help="Hilos para el renombrado")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla del generador")
+    parser.add_argument("--tmpdir", default=None, help="Directorio donde crear los árboles (p. ej. /dev/shm)")
+    parser.add_argument("--output", default="-", help="Archivo JSON de resultados ('-' = salida estándar)")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Empeoramiento relativo admitido antes de fallar (0.15 = 15%%)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    config = {key: getattr(args, key) for key in (
+        'breadth', 'depth', 'accents', 'spaces', 'symbols', 'collisions',
+        'names', 'repeat', 'workers', 'seed', 'tmpdir')}
+
+    results = run_suite(config)
+    for key, label in METRIC_LABELS.items():
+        print(f"📊 {label:<14} {results['metrics'][key]:12,.0f}/s", file=sys.stderr)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('config') != config:
+            print("⚠️  La línea base se generó con otra configuración; la comparación puede no ser válida",
+                  file=sys.stderr)
+        regressions = compare_with_baseline(results['metrics'], baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} métricas empeoraron más de un {args.tolerance:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -45,12 +45,13 @@ def check_requirements():
         print("Error: Python no encontrado")
         return False
     
-    # Verificar archivo fuente
-    if not os.path.exists("rename_folders.py"):
-        print("Error: No se encuentra 'rename_folders.py'")
-        return False
+    # Verificar archivos fuente
+    for source in ("rename_folders.py", "rename_folders_gui.py", "rename_folders_core.py"):
+        if not os.path.exists(source):
+            print(f"Error: No se encuentra '{source}'")
+            return False
     
-    print("OK: Archivo fuente encontrado")
+    print("OK: Archivos fuente encontrados")
     
     # Verificar/instalar PyInstaller
     try:
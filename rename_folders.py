@@ -9,12 +9,58 @@ Fecha: 2025-06-01
 """
 
 import os
-import re
+import signal
 import sys
-import unicodedata
+import threading
 from pathlib import Path
 import time
 from datetime import datetime
+from itertools import chain
+
+from rename_folders_core import (
+    CONFLICT_LABELS,
+    DEFAULT_OPTIONS,
+    FILE_COUNTER_PREFIX,
+    KIND_FILE,
+    KIND_FOLDER,
+    KIND_LABELS,
+    METRIC_LABELS,
+    METRIC_PERCENTILES,
+    METRIC_RENAME,
+    ProgressTracker,
+    RESULT_CONFLICT,
+    RESULT_DENIED,
+    RESULT_EXISTS,
+    RESULT_PENDING,
+    RESULT_RENAMED,
+    RESULT_UNCHANGED,
+    RunMetrics,
+    STAT_CALLS_NOTE,
+    STATUS_CONFLICT,
+    STATUS_UNCHANGED,
+    SUFFIX_HASH,
+    SUFFIX_LABELS,
+    SUFFIX_NUMBER,
+    atomic_renames_available,
+    conflict_reason,
+    count_by_kind,
+    execute_renames,
+    find_incomplete_journals,
+    find_last_undoable_journal,
+    format_progress,
+    iter_plan_file,
+    iter_plan_rows,
+    mark_journal,
+    new_run_counts,
+    normalize_file_names,
+    normalize_many,
+    options_key,
+    read_plan_header,
+    signature_changed,
+    undo_journal,
+    validate_plan_rows,
+    write_plan,
+)
 
 # Configuración para PyInstaller
 def resource_path(relative_path):
@@ -41,71 +87,6 @@ def clear_screen():
     except:
         print("\n" * 50)
 
-def normalize_folder_name(name, options=None):
-    """
-    Normaliza el nombre de la carpeta según las opciones especificadas
-    """
-    if not name or not isinstance(name, str):
-        return 'unnamed_folder'
-    
-    original_name = name
-    
-    # Opciones por defecto
-    if options is None:
-        options = {
-            'lowercase': True,
-            'remove_accents': True,
-            'replace_spaces': True,
-            'remove_special': True,
-            'preserve_numbers': True,
-            'preserve_dots': False
-        }
-    
-    # Convertir a minúsculas si está habilitado
-    if options.get('lowercase', True):
-        name = name.lower()
-    
-    # Eliminar acentos si está habilitado
-    if options.get('remove_accents', True):
-        try:
-            name = unicodedata.normalize('NFD', name)
-            name = ''.join(char for char in name if unicodedata.category(char) != 'Mn')
-        except:
-            pass
-    
-    # Construir patrón de caracteres permitidos
-    allowed_chars = r'a-zA-Z'
-    
-    if options.get('preserve_numbers', True):
-        allowed_chars += r'0-9'
-    
-    if options.get('preserve_dots', False):
-        allowed_chars += r'\.'
-    
-    # Reemplazar espacios
-    if options.get('replace_spaces', True):
-        name = re.sub(r'\s+', '_', name)
-        allowed_chars += r'_'
-    else:
-        allowed_chars += r'\s'
-    
-    # Eliminar caracteres especiales si está habilitado
-    if options.get('remove_special', True):
-        pattern = f'[^{allowed_chars}]'
-        name = re.sub(pattern, '_', name)
-    
-    # Limpiar múltiples guiones bajos consecutivos
-    name = re.sub(r'_+', '_', name)
-    
-    # Eliminar guiones bajos al inicio y final
-    name = name.strip('_')
-    
-    # Si el nombre queda vacío, usar un nombre por defecto
-    if not name:
-        name = 'unnamed_folder'
-    
-    return name
-
 def get_exe_directory():
     """Obtiene el directorio donde está el ejecutable o script"""
     if getattr(sys, 'frozen', False):
@@ -136,7 +117,7 @@ def show_welcome_screen():
     print("║      • Vista previa antes de hacer cambios                                  ║")
     print("║      • Procesamiento por lotes de todas las carpetas                        ║")
     print("║      • Opciones personalizables                                             ║")
-    print("║      • Seguro: no modifica archivos, solo nombres de carpetas               ║")
+    print("║      • Seguro: solo cambia nombres, nunca el contenido                      ║")
     print("║                                                                              ║")
     print("║  📂 DIRECTORIO DE TRABAJO:                                                  ║")
     print(f"║      {get_exe_directory():<68} ║")
@@ -151,14 +132,7 @@ def show_welcome_screen():
 
 def show_options_menu():
     """Muestra el menú de opciones de normalización"""
-    options = {
-        'lowercase': True,
-        'remove_accents': True,
-        'replace_spaces': True,
-        'remove_special': True,
-        'preserve_numbers': True,
-        'preserve_dots': False
-    }
+    options = dict(DEFAULT_OPTIONS)
     
     while True:
         clear_screen()
@@ -175,6 +149,10 @@ def show_options_menu():
         print(f"║  4. Eliminar caracteres especiales {status_map[options['remove_special']]:<25} ║")
         print(f"║  5. Preservar números             {status_map[options['preserve_numbers']]:<25} ║")
         print(f"║  6. Preservar puntos              {status_map[options['preserve_dots']]:<25} ║")
+        print(f"║  R. Incluir subcarpetas (recursivo) {status_map[options['recursive']]:<23} ║")
+        print(f"║  H. Hilos de renombrado           {options['workers']:<25} ║")
+        print(f"║  C. Colisiones                    {SUFFIX_LABELS[options['collision_suffix']]:<25} ║")
+        print(f"║  A. Incluir archivos              {status_map[options['include_files']]:<25} ║")
         print("║                                                                              ║")
         print("║  7. 🔍 Ver ejemplo con configuración actual                                  ║")
         print("║  8. ✅ Continuar con estas opciones                                          ║")
@@ -182,7 +160,7 @@ def show_options_menu():
         print("║                                                                              ║")
         print("╚" + "═" * 78 + "╝")
         
-        choice = input("\nSelecciona una opción (1-9): ").strip()
+        choice = input("\nSelecciona una opción (1-9, R, H, C, A): ").strip().lower()
         
         if choice == '1':
             options['lowercase'] = not options['lowercase']
@@ -196,6 +174,19 @@ def show_options_menu():
             options['preserve_numbers'] = not options['preserve_numbers']
         elif choice == '6':
             options['preserve_dots'] = not options['preserve_dots']
+        elif choice == 'r':
+            options['recursive'] = not options['recursive']
+        elif choice == 'h':
+            # Alternar entre las cantidades de hilos más habituales
+            worker_steps = (1, 2, 4, 8, 16)
+            current = options['workers'] if options['workers'] in worker_steps else 1
+            options['workers'] = worker_steps[(worker_steps.index(current) + 1) % len(worker_steps)]
+        elif choice == 'c':
+            # Alternar entre omitir las colisiones o resolverlas con un sufijo
+            strategies = list(SUFFIX_LABELS)
+            options['collision_suffix'] = strategies[(strategies.index(options['collision_suffix']) + 1) % len(strategies)]
+        elif choice == 'a':
+            options['include_files'] = not options['include_files']
         elif choice == '7':
             show_example_transformation(options)
         elif choice == '8':
@@ -223,8 +214,13 @@ def show_example_transformation(options):
         "Proyecto Final - Versión 2.0"
     ]
     
-    for i, example in enumerate(examples, 1):
-        transformed = normalize_folder_name(example, options)
+    transformations = list(zip(examples, normalize_many(examples, options)))
+    if options.get('include_files'):
+        # Los archivos conservan su extensión aunque no se preserven los puntos
+        file_examples = ["Foto Playa Ñandú.JPG", "Informe Final v1.2.PDF"]
+        transformations += zip(file_examples, normalize_file_names(file_examples, options))
+    
+    for i, (example, transformed) in enumerate(transformations, 1):
         print(f"{i}. '{example}'")
         print(f"   → '{transformed}'")
         print()
@@ -235,8 +231,195 @@ def show_example_transformation(options):
     except:
         time.sleep(2)
 
-def rename_folders(directory_path, options=None):
-    """Renombra todas las carpetas en el directorio especificado"""
+def print_conflict_groups(groups):
+    """Muestra los grupos de colisión detectados antes de procesar"""
+    print(f"⚠️  COLISIONES DETECTADAS ({len(groups)} grupos):")
+    for group in groups.values():
+        sources = ", ".join(f"'{name}'" for name in group['sources'])
+        line = f"   '{group['target']}' ← {sources}"
+        if group['existing'] is not None:
+            line += f" (ya existe '{group['existing']}')"
+        print(line)
+    print()
+
+def schedule_note(item):
+    """Texto que explica el orden resuelto de un renombrado que depende de otro"""
+    if item.get('via'):
+        return f" (vía temporal '{item['via']}' para intercambiar nombres)"
+    if item.get('after'):
+        return f" (después de renombrar '{item['after']}')"
+    return ""
+
+def entries_noun(options):
+    """Cómo llamar a las entradas planificadas según se incluyan o no los archivos"""
+    return "entradas" if options and options.get('include_files') else "carpetas"
+
+def kind_mark(item):
+    """Marca de las filas de archivos; las carpetas se muestran sin marca"""
+    return "📄 " if item.get('kind') == KIND_FILE else ""
+
+def print_kind_counts(stats, indent="   "):
+    """Desglosa por carpetas y archivos los contadores del plan, si hubo archivos"""
+    by_kind = count_by_kind(stats)
+    if not by_kind[KIND_FILE]['total']:
+        return
+    for kind, icon in ((KIND_FOLDER, "📁"), (KIND_FILE, "📄")):
+        counts = by_kind[kind]
+        print(f"{indent}{icon} {KIND_LABELS[kind].capitalize()}: {counts['changes']} cambios, "
+              f"{counts['conflicts']} conflictos, {counts['unchanged']} sin cambios")
+
+def print_directory_header(item, recursive, noun="carpetas"):
+    """Muestra la cabecera de un directorio al llegar a su primera fila del plan"""
+    if recursive:
+        print(f"📂 [nivel {item['depth']}] {item['folder'].parent} ({item['count']} {noun})")
+    else:
+        print(f"📁 Se encontraron {item['count']} {noun}.\n")
+    
+    if item['groups']:
+        print_conflict_groups(item['groups'])
+
+def print_metrics(metrics, indent="   "):
+    """Muestra el tiempo por fase y la latencia de los renombrados de un RunMetrics"""
+    summary = metrics.summary()
+    print(f"{indent}⏱️  Tiempo total: {summary['elapsed']:.3f} s")
+    for phase, label in METRIC_LABELS.items():
+        totals = summary['phases'].get(phase)
+        if totals:
+            print(f"{indent}   {label:<15} {totals['seconds']:9.3f} s  ({totals['calls']} llamadas)")
+    latency = summary['latencies'].get(METRIC_RENAME)
+    if latency:
+        percentiles = " · ".join(f"p{percentile} {latency[f'p{percentile}'] * 1000:.2f} ms"
+                                 for percentile in METRIC_PERCENTILES)
+        print(f"{indent}   Latencia rename: {percentiles} · máx {latency['max'] * 1000:.2f} ms")
+
+class ProgressLine:
+    """
+    Indicador de progreso de una sola línea que se reescribe en el sitio.
+    Solo se dibuja si la salida es una consola (no en logs ni tareas programadas).
+    """
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.enabled = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.width = 0
+    
+    def show(self, snapshot):
+        """Dibuja el estado de un ProgressTracker (se usa como su callback)"""
+        if not self.enabled:
+            return
+        text = "⏳ " + format_progress(snapshot)
+        self.stream.write("\r" + text.ljust(self.width))
+        self.stream.flush()
+        self.width = len(text)
+    
+    def clear(self):
+        """Borra la línea de progreso"""
+        if self.enabled and self.width:
+            self.stream.write("\r" + " " * self.width + "\r")
+            self.stream.flush()
+            self.width = 0
+    
+    def print(self, text=""):
+        """Imprime una línea normal sin mezclarla con la de progreso"""
+        self.clear()
+        print(text)
+
+def execute_plan_rows(plan_rows, base_path, options=None, recursive=False, show_headers=True, total=None,
+                      metrics=None):
+    """
+    Aplica un flujo de filas del plan mostrando el progreso; Ctrl+C lo cancela de forma ordenada.
+    Devuelve los contadores de execute_renames.
+    """
+    workers = max(1, int(options.get('workers', 1))) if options else 1
+    if workers > 1:
+        print(f"🧵 Renombrando con {workers} hilos en paralelo.\n")
+    
+    counts = new_run_counts()
+    noun = entries_noun(options)
+    line = ProgressLine()
+    say = line.print
+    progress = ProgressTracker(line.show)
+    
+    def request_cancel(signum, frame):
+        """Primer Ctrl+C: cancelación ordenada; el segundo interrumpe"""
+        if progress.cancelled:
+            raise KeyboardInterrupt
+        progress.cancel()
+        say("\n⏹️  Cancelando: se terminan los renombrados en curso (Ctrl+C otra vez para interrumpir)...")
+    
+    previous_handler = None
+    if threading.current_thread() is threading.main_thread():
+        previous_handler = signal.signal(signal.SIGINT, request_cancel)
+    
+    events = execute_renames(plan_rows, base_path, options, counts, progress, metrics, total)
+    try:
+        for item, result, error in events:
+            if item['count'] is None:
+                position = f"[{item['index']:2d}]"
+            else:
+                position = f"[{item['index']:2d}/{item['count']}]"
+            original_name = item['original_name']
+            mark = kind_mark(item)
+            
+            if result in (RESULT_PENDING, RESULT_UNCHANGED, RESULT_CONFLICT):
+                # Filas en el orden del plan
+                if show_headers and item['index'] == 1:
+                    line.clear()
+                    print_directory_header(item, recursive, noun)
+                if result == RESULT_UNCHANGED:
+                    say(f"{position} ✅ Sin cambios: {mark}'{original_name}'")
+                elif result == RESULT_CONFLICT:
+                    say(f"{position} ⚠️  CONFLICTO: {mark}'{original_name}' → '{item['new_name']}' ({CONFLICT_LABELS[item['conflict']]})")
+                if recursive and item['index'] == item['count']:
+                    say()
+            elif result == RESULT_RENAMED:
+                say(f"{position} 🔄 RENOMBRADO: {mark}'{original_name}' → '{item['new_name']}'")
+            elif result == RESULT_EXISTS:
+                # El destino apareció después de planificar: no se reemplaza
+                say(f"{position} ⚠️  CONFLICTO: {mark}'{original_name}' → '{item['new_name']}' ({conflict_reason(error)})")
+            elif result == RESULT_DENIED:
+                say(f"{position} ❌ ERROR: Sin permisos para renombrar {mark}'{original_name}'")
+            elif isinstance(error, OSError):
+                say(f"{position} ❌ ERROR renombrando {mark}'{original_name}': {error}")
+            else:
+                say(f"{position} ❌ ERROR inesperado con {mark}'{original_name}': {error}")
+    finally:
+        # Si se interrumpe aquí, cerrar el generador deja el diario sin marca de fin
+        events.close()
+        line.clear()
+        if previous_handler is not None:
+            signal.signal(signal.SIGINT, previous_handler)
+    
+    if counts['cancelled']:
+        print(f"\n⏹️  Renombrado cancelado: {counts['renamed']} {noun} renombradas antes de detenerse; "
+              f"las restantes no se modificaron.")
+    
+    return counts
+
+def preview_key(base_path, options):
+    """Identifica el directorio y las opciones que determinan las filas de una vista previa"""
+    options = options or {}
+    return (str(base_path), options_key(options), bool(options.get('recursive', False)),
+            options.get('collision_suffix'), bool(options.get('include_files', False)))
+
+def preview_is_current(plan, base_path, options, stats=None):
+    """
+    Indica si el plan guardado por preview_changes sigue sirviendo: mismo
+    directorio, mismas opciones y ningún directorio listado modificado desde entonces.
+    """
+    if plan.get('key') != preview_key(base_path, options):
+        return False
+    return not signature_changed(plan['signature'], stats)
+
+def rename_folders(directory_path, options=None, stats=None, plan=None):
+    """
+    Renombra todas las carpetas (y, con 'include_files', los archivos) en el
+    directorio especificado.
+    Si se pasa un diccionario stats, se completa con los contadores de la
+    ejecución ('renamed', 'skipped', 'errors', 'total', ...).
+    Si se pasa el plan guardado por preview_changes y el directorio no cambió,
+    se aplica directamente sin volver a listar ni normalizar.
+    """
     try:
         base_path = Path(directory_path).resolve()
         
@@ -253,8 +436,26 @@ def rename_folders(directory_path, options=None):
         print(f"   {base_path}")
         print("═" * 80)
         
+        recursive = bool(options and options.get('recursive', False))
+        stats = {} if stats is None else stats
+        total = None
+        
+        if plan and plan.get('rows'):
+            if preview_is_current(plan, base_path, options, stats):
+                print("♻️  Se reutiliza la vista previa: el directorio no cambió desde entonces.\n")
+                # Los contadores del análisis (vía rápida, total...) son los de la vista previa
+                stats.update({key: value for key, value in plan['stats'].items()
+                              if key not in ('stat_calls', 'metrics')})
+                plan_rows = iter(plan['rows'])
+                total = plan['stats'].get('changes')
+            else:
+                print("🔄 El directorio o las opciones cambiaron desde la vista previa; se vuelve a analizar.\n")
+                plan_rows = iter_plan_rows(base_path, options, stats, recursive)
+        else:
+            plan_rows = iter_plan_rows(base_path, options, stats, recursive)
+        
         try:
-            folders = [item for item in base_path.iterdir() if item.is_dir()]
+            first_row = next(plan_rows, None)
         except PermissionError:
             print("❌ ERROR: Sin permisos para acceder al directorio.")
             return False
@@ -262,57 +463,44 @@ def rename_folders(directory_path, options=None):
             print(f"❌ ERROR al listar carpetas: {e}")
             return False
         
-        if not folders:
-            print("ℹ️  INFO: No se encontraron carpetas para renombrar.")
+        if first_row is None:
+            print(f"ℹ️  INFO: No se encontraron {entries_noun(options)} para renombrar.")
             return True
         
-        print(f"📁 Se encontraron {len(folders)} carpetas.\n")
+        if recursive:
+            print("🌳 Modo recursivo: se procesan las subcarpetas de abajo hacia arriba.\n")
         
-        renamed_count = 0
-        skipped_count = 0
-        error_count = 0
+        counts = execute_plan_rows(chain([first_row], plan_rows), base_path, options, recursive,
+                                   total=total, metrics=stats.get('metrics'))
         
-        for i, folder in enumerate(folders, 1):
-            try:
-                original_name = folder.name
-                new_name = normalize_folder_name(original_name, options)
-                
-                print(f"[{i:2d}/{len(folders)}] ", end="", flush=True)
-                
-                if original_name == new_name:
-                    print(f"✅ Sin cambios: '{original_name}'")
-                    skipped_count += 1
-                    continue
-                
-                new_path = folder.parent / new_name
-                
-                if new_path.exists():
-                    print(f"⚠️  CONFLICTO: '{original_name}' → '{new_name}' (ya existe)")
-                    error_count += 1
-                    continue
-                
-                folder.rename(new_path)
-                print(f"🔄 RENOMBRADO: '{original_name}' → '{new_name}'")
-                renamed_count += 1
-                
-            except PermissionError:
-                print(f"❌ ERROR: Sin permisos para renombrar '{folder.name}'")
-                error_count += 1
-            except OSError as e:
-                print(f"❌ ERROR renombrando '{folder.name}': {e}")
-                error_count += 1
-            except Exception as e:
-                print(f"❌ ERROR inesperado con '{folder.name}': {e}")
-                error_count += 1
+        stats.update(counts)
+        renamed_count = counts['renamed']
+        skipped_count = counts['skipped']
+        error_count = counts['errors']
+        total_count = stats.get('total', 0)
         
         print("\n" + "═" * 80)
         print("📊 RESUMEN:")
-        print(f"   ✅ Carpetas renombradas: {renamed_count}")
-        print(f"   ➡️  Carpetas sin cambios: {skipped_count}")
+        files_renamed = counts[FILE_COUNTER_PREFIX + 'renamed']
+        print(f"   ✅ Carpetas renombradas: {renamed_count - files_renamed}")
+        if options and options.get('include_files'):
+            print(f"   📄 Archivos renombrados: {files_renamed}")
+        print(f"   ➡️  Sin cambios: {skipped_count}")
         print(f"   ❌ Errores/conflictos: {error_count}")
-        print(f"   📁 Total procesadas: {len(folders)}")
+        print(f"   📁 Total procesadas: {total_count}")
+        print_kind_counts(stats, indent="      ")
+        print(f"   ⚡ Ya normalizadas (vía rápida): {stats.get('fast_path', 0)}")
+        if stats.get('suffixed'):
+            print(f"   🔢 Colisiones resueltas con sufijo: {stats['suffixed']}")
+        print(f"   🔎 Llamadas stat emitidas: {stats.get('stat_calls', 0)} {STAT_CALLS_NOTE}")
+        if stats.get('scan_errors'):
+            print(f"   🚫 Subcarpetas sin acceso (omitidas): {stats['scan_errors']}")
+        if counts['journal']:
+            print(f"   📝 Diario para deshacer: {counts['journal']}")
+        if stats.get('metrics'):
+            print_metrics(stats['metrics'])
         
-        if renamed_count > 0:
+        if renamed_count > 0 and not counts['cancelled']:
             print(f"\n🎉 ¡Renombrado completado exitosamente!")
         
         return True
@@ -321,8 +509,14 @@ def rename_folders(directory_path, options=None):
         print(f"❌ ERROR general: {e}")
         return False
 
-def preview_changes(directory_path, options=None):
-    """Muestra una vista previa de los cambios que se realizarían"""
+def preview_changes(directory_path, options=None, stats=None, plan=None):
+    """
+    Muestra una vista previa de los cambios que se realizarían.
+    Si se pasa un diccionario stats, se completa con los contadores
+    ('changes', 'conflicts', 'total', ...).
+    Si se pasa un diccionario plan, se guardan en él las filas calculadas y una
+    firma de los directorios listados para que rename_folders las reutilice.
+    """
     try:
         base_path = Path(directory_path).resolve()
         
@@ -334,8 +528,14 @@ def preview_changes(directory_path, options=None):
         print(f"   {base_path}")
         print("═" * 80)
         
+        recursive = bool(options and options.get('recursive', False))
+        stats = {} if stats is None else stats
+        signature = {} if plan is not None else None
+        kept_rows = [] if plan is not None else None
+        plan_rows = iter_plan_rows(base_path, options, stats, recursive, signature)
+        
         try:
-            folders = [item for item in base_path.iterdir() if item.is_dir()]
+            first_row = next(plan_rows, None)
         except PermissionError:
             print("❌ ERROR: Sin permisos para acceder al directorio.")
             return False
@@ -343,40 +543,57 @@ def preview_changes(directory_path, options=None):
             print(f"❌ ERROR al listar carpetas: {e}")
             return False
         
-        if not folders:
-            print("ℹ️  INFO: No se encontraron carpetas.")
+        noun = entries_noun(options)
+        if first_row is None:
+            print(f"ℹ️  INFO: No se encontraron {noun}.")
             return True
         
-        changes_count = 0
-        conflicts_count = 0
-        
         print("📋 CAMBIOS PROPUESTOS:\n")
         
-        for i, folder in enumerate(folders, 1):
-            try:
-                original_name = folder.name
-                new_name = normalize_folder_name(original_name, options)
-                
-                print(f"[{i:2d}] ", end="")
-                
-                if original_name != new_name:
-                    new_path = folder.parent / new_name
-                    if new_path.exists():
-                        print(f"⚠️  '{original_name}' → '{new_name}' (CONFLICTO - ya existe)")
-                        conflicts_count += 1
-                    else:
-                        print(f"🔄 '{original_name}' → '{new_name}'")
-                        changes_count += 1
-                else:
-                    print(f"✅ '{original_name}' (sin cambios)")
-                    
-            except Exception as e:
-                print(f"[{i:2d}] ❌ ERROR procesando carpeta: {e}")
+        # Las filas se muestran a medida que se generan; los contadores
+        # del resumen se acumulan en stats durante el recorrido
+        for item in chain([first_row], plan_rows):
+            if item['index'] == 1:
+                print_directory_header(item, recursive, noun)
+            if kept_rows is not None:
+                kept_rows.append(item)
+            
+            original_name = item['original_name']
+            new_name = item['new_name']
+            mark = kind_mark(item)
+            
+            if item['status'] == STATUS_UNCHANGED:
+                print(f"[{item['index']:2d}] ✅ {mark}'{original_name}' (sin cambios)")
+            elif item['status'] == STATUS_CONFLICT:
+                print(f"[{item['index']:2d}] ⚠️  {mark}'{original_name}' → '{new_name}' (CONFLICTO - {CONFLICT_LABELS[item['conflict']]})")
+            else:
+                print(f"[{item['index']:2d}] 🔄 {mark}'{original_name}' → '{new_name}'{schedule_note(item)}")
+            
+            if recursive and item['index'] == item['count']:
+                print()
+        
+        changes_count = stats.get('changes', 0)
+        conflicts_count = stats.get('conflicts', 0)
+        groups_count = stats.get('conflict_groups', 0)
+        total_count = stats.get('total', 0)
+        
+        if plan is not None:
+            plan.update(key=preview_key(base_path, options),
+                        signature=signature, rows=kept_rows, stats=dict(stats))
         
         print("\n" + "═" * 80)
-        print(f"📊 Se realizarían {changes_count} cambios de {len(folders)} carpetas.")
+        print(f"📊 Se realizarían {changes_count} cambios de {total_count} {noun}.")
+        print_kind_counts(stats)
+        print(f"⚡ Ya normalizadas (vía rápida): {stats.get('fast_path', 0)}")
+        if stats.get('suffixed'):
+            print(f"🔢 Colisiones resueltas con sufijo: {stats['suffixed']}")
+        print(f"🔎 Llamadas stat emitidas: {stats.get('stat_calls', 0)} {STAT_CALLS_NOTE}")
+        if stats.get('scan_errors'):
+            print(f"🚫 Subcarpetas sin acceso (omitidas): {stats['scan_errors']}")
         if conflicts_count > 0:
-            print(f"⚠️  Advertencia: {conflicts_count} conflictos detectados.")
+            print(f"⚠️  Advertencia: {conflicts_count} conflictos detectados en {groups_count} grupos.")
+        if stats.get('metrics'):
+            print_metrics(stats['metrics'], indent="")
         
         return True
         
@@ -384,6 +601,172 @@ def preview_changes(directory_path, options=None):
         print(f"❌ ERROR: {e}")
         return False
 
+def save_plan(directory_path, plan_path, options=None, stats=None):
+    """
+    Calcula el plan de renombrado y lo guarda en un archivo JSONL para
+    revisarlo y aplicarlo más tarde con apply_plan, sin renombrar nada.
+    """
+    try:
+        base_path = Path(directory_path).resolve()
+        
+        if not base_path.exists() or not base_path.is_dir():
+            print(f"❌ ERROR: Directorio no válido.")
+            return False
+        
+        recursive = bool(options and options.get('recursive', False))
+        stats = {} if stats is None else stats
+        
+        print(f"📝 Guardando plan de renombrado de:")
+        print(f"   {base_path}")
+        
+        try:
+            written = write_plan(plan_path, iter_plan_rows(base_path, options, stats, recursive),
+                                 base_path, options)
+        except PermissionError:
+            print("❌ ERROR: Sin permisos para acceder al directorio o escribir el plan.")
+            return False
+        
+        print("═" * 80)
+        print(f"📊 Plan guardado en: {plan_path}")
+        print(f"   🔄 Renombrados: {written['changes']}")
+        print(f"   ⚠️  Conflictos (se omitirán): {written['conflicts']}")
+        print(f"   📁 Total analizadas: {stats.get('total', 0)}")
+        print_kind_counts(stats, indent="      ")
+        if stats.get('metrics'):
+            print_metrics(stats['metrics'])
+        return True
+        
+    except Exception as e:
+        print(f"❌ ERROR: {e}")
+        return False
+
+def apply_plan(plan_path, options=None, stats=None, base_path=None, dry_run=False):
+    """
+    Aplica un plan guardado con save_plan leyéndolo en flujo.
+    No se normaliza nada: cada fila se valida con un lstat del origen y del
+    destino justo antes de renombrarla (solo del origen si los renombrados
+    son atómicos y no pueden reemplazar un destino). Con dry_run solo se informa qué filas
+    siguen siendo válidas. De options solo se usa 'workers'.
+    """
+    try:
+        header = read_plan_header(plan_path)
+    except (OSError, ValueError) as e:
+        print(f"❌ ERROR: No se pudo leer el plan: {e}")
+        return False
+    
+    try:
+        base_path = Path(base_path or header['base']).resolve()
+        if not base_path.is_dir():
+            print(f"❌ ERROR: El directorio del plan no existe: {base_path}")
+            return False
+        
+        stats = {} if stats is None else stats
+        plan_options = dict(header.get('options') or DEFAULT_OPTIONS)
+        if options and 'workers' in options:
+            plan_options['workers'] = options['workers']
+        
+        print(f"📋 Aplicando plan: {plan_path}")
+        print(f"   Creado: {header.get('created', '?')}")
+        print(f"   📂 {base_path}")
+        print("═" * 80)
+        
+        # Con renombrados atómicos el destino lo comprueba el propio rename (EEXIST)
+        check_targets = dry_run or not atomic_renames_available()
+        rows = validate_plan_rows(iter_plan_file(plan_path, base_path, stats), stats, check_targets)
+        
+        if dry_run:
+            for item in rows:
+                if item['status'] == STATUS_CONFLICT:
+                    print(f"[{item['index']:2d}] ⚠️  {kind_mark(item)}'{item['original_name']}' → '{item['new_name']}' (CONFLICTO - {CONFLICT_LABELS[item['conflict']]})")
+                else:
+                    print(f"[{item['index']:2d}] 🔄 {kind_mark(item)}'{item['original_name']}' → '{item['new_name']}'{schedule_note(item)}")
+            counts = {'renamed': 0, 'skipped': 0, 'errors': stats.get('conflicts', 0) + stats.get('stale', 0)}
+        else:
+            counts = execute_plan_rows(rows, base_path, plan_options, show_headers=False,
+                                       metrics=stats.get('metrics'))
+        
+        stats.update(counts)
+        
+        print("\n" + "═" * 80)
+        print("📊 RESUMEN DEL PLAN:")
+        if not dry_run:
+            files_renamed = counts[FILE_COUNTER_PREFIX + 'renamed']
+            print(f"   ✅ Carpetas renombradas: {counts['renamed'] - files_renamed}")
+            if files_renamed:
+                print(f"   📄 Archivos renombrados: {files_renamed}")
+        print(f"   🔄 Renombrados en el plan: {stats.get('changes', 0)}")
+        print(f"   ⚠️  Conflictos del plan: {stats.get('conflicts', 0)}")
+        print_kind_counts(stats, indent="      ")
+        print(f"   🕒 Filas que ya no son válidas: {stats.get('stale', 0)}")
+        if stats.get('plan_truncated'):
+            print("   ⚠️  El plan está incompleto (falta la línea final); se aplicó hasta donde se pudo leer.")
+        if counts.get('journal'):
+            print(f"   📝 Diario para deshacer: {counts['journal']}")
+        if stats.get('metrics'):
+            print_metrics(stats['metrics'])
+        return True
+        
+    except Exception as e:
+        print(f"❌ ERROR general: {e}")
+        return False
+
+def undo_run(journal):
+    """Deshace los renombrados de un diario mostrando el progreso"""
+    restored_count = 0
+    error_count = 0
+    
+    print(f"↩️  Deshaciendo {len(journal['renames'])} renombrados...\n")
+    for target, source, error in undo_journal(journal):
+        if error is None:
+            print(f"↩️  RESTAURADO: '{target}' → '{source}'")
+            restored_count += 1
+        else:
+            print(f"❌ ERROR restaurando '{target}': {error}")
+            error_count += 1
+    
+    print("\n" + "═" * 80)
+    print("📊 RESUMEN:")
+    print(f"   ↩️  Entradas restauradas: {restored_count}")
+    print(f"   ❌ Errores: {error_count}")
+    if error_count:
+        print("\n💡 El diario sigue pendiente: vuelve a deshacer para reintentar las entradas que faltan.")
+    return error_count == 0
+
+def check_incomplete_journals():
+    """Detecta renombrados interrumpidos y ofrece completarlos o revertirlos"""
+    for journal in find_incomplete_journals():
+        header = journal['header']
+        clear_screen()
+        print("╔" + "═" * 78 + "╗")
+        print("║" + " " * 24 + "⚠️  RENOMBRADO INCOMPLETO" + " " * 29 + "║")
+        print("╚" + "═" * 78 + "╝")
+        print()
+        print("Una ejecución anterior se interrumpió antes de terminar.")
+        print(f"📂 Directorio: {header.get('base', '?')}")
+        print(f"📅 Fecha: {header.get('started', '?')}")
+        print(f"🔄 Renombrados realizados: {len(journal['renames'])}")
+        print()
+        print("  1. ▶️  Completar (volver a ejecutar con las mismas opciones)")
+        print("  2. ↩️  Revertir los renombrados ya realizados")
+        print("  3. 🗑️  Descartar este aviso")
+        print("  Enter: decidir más tarde")
+        
+        choice = input("\nSelecciona una opción: ").strip()
+        print()
+        
+        if choice == '1':
+            mark_journal(journal['path'], 'resumed')
+            rename_folders(header.get('base', ''), header.get('options'))
+        elif choice == '2':
+            undo_run(journal)
+        elif choice == '3':
+            mark_journal(journal['path'], 'discarded')
+            print("🗑️  Aviso descartado.")
+        else:
+            continue
+        
+        input("\nPresiona Enter para continuar...")
+
 def main():
     """Función principal con menú interactivo moderno"""
     try:
@@ -399,9 +782,14 @@ def main():
         # Mostrar pantalla de bienvenida
         show_welcome_screen()
         
+        # Ofrecer completar o revertir ejecuciones interrumpidas
+        check_incomplete_journals()
+        
         # Obtener el directorio de trabajo
         exe_dir = get_exe_directory()
         current_options = None
+        # Plan de la última vista previa, para no volver a analizar al ejecutar
+        last_preview = None
         
         while True:
             clear_screen()
@@ -419,7 +807,8 @@ def main():
             print("║     2. 🔍 Vista previa de cambios                                            ║")
             print("║     3. 🚀 Ejecutar renombrado                                                ║")
             print("║     4. ❓ Mostrar ayuda                                                       ║")
-            print("║     5. 🚪 Salir                                                              ║")
+            print("║     5. ↩️  Deshacer último renombrado                                         ║")
+            print("║     6. 🚪 Salir                                                              ║")
             print("║                                                                              ║")
             
             if current_options:
@@ -430,7 +819,7 @@ def main():
             print("║                                                                              ║")
             print("╚" + "═" * 78 + "╝")
             
-            choice = input("\n🎯 Selecciona una opción (1-5): ").strip()
+            choice = input("\n🎯 Selecciona una opción (1-6): ").strip()
             
             if choice == '1':
                 new_options = show_options_menu()
@@ -445,9 +834,11 @@ def main():
                 print("║" + " " * 30 + "VISTA PREVIA" + " " * 33 + "║")
                 print("╚" + "═" * 78 + "╝")
                 print()
-                if preview_changes(exe_dir, current_options):
+                last_preview = {}
+                if preview_changes(exe_dir, current_options, plan=last_preview):
                     print("\n🔍 Vista previa completada.")
                 else:
+                    last_preview = None
                     print("\n❌ Error en la vista previa.")
                 input("\nPresiona Enter para continuar...")
                 
@@ -464,10 +855,12 @@ def main():
                 
                 if confirm in ['s', 'si', 'y', 'yes', '']:
                     print("\n🚀 Iniciando renombrado...\n")
-                    if rename_folders(exe_dir, current_options):
+                    if rename_folders(exe_dir, current_options, plan=last_preview):
                         print("\n✅ Proceso completado.")
                     else:
                         print("\n❌ El proceso terminó con errores.")
+                    # Tras renombrar, la vista previa ya no describe el directorio
+                    last_preview = None
                 else:
                     print("\n🚫 Operación cancelada.")
                 
@@ -477,6 +870,27 @@ def main():
                 show_help()
                 
             elif choice == '5':
+                clear_screen()
+                print("╔" + "═" * 78 + "╗")
+                print("║" + " " * 27 + "DESHACER RENOMBRADO" + " " * 32 + "║")
+                print("╚" + "═" * 78 + "╝")
+                print()
+                journal = find_last_undoable_journal()
+                if journal is None:
+                    print("ℹ️  INFO: No hay renombrados registrados para deshacer.")
+                else:
+                    print(f"📂 Directorio: {journal['header'].get('base', '?')}")
+                    print(f"📅 Fecha: {journal['header'].get('started', '?')}")
+                    print(f"🔄 Renombrados registrados: {len(journal['renames'])}")
+                    confirm = input("\n🤔 ¿Deshacer estos renombrados? (S/n): ").strip().lower()
+                    if confirm in ['s', 'si', 'y', 'yes', '']:
+                        print()
+                        undo_run(journal)
+                    else:
+                        print("\n🚫 Operación cancelada.")
+                input("\nPresiona Enter para continuar...")
+                
+            elif choice == '6':
                 clear_screen()
                 print("╔" + "═" * 78 + "╗")
                 print("║" + " " * 25 + "¡GRACIAS POR USAR EL PROGRAMA!" + " " * 22 + "║")
@@ -487,7 +901,7 @@ def main():
                 break
                 
             else:
-                print("❌ Opción no válida. Por favor, selecciona 1, 2, 3, 4 o 5.")
+                print("❌ Opción no válida. Por favor, selecciona una opción del 1 al 6.")
                 time.sleep(1)
                 
     except KeyboardInterrupt:
@@ -522,16 +936,175 @@ def show_help():
     print("║      • Eliminar especiales: Quita símbolos como @#$%&*()                   ║")
     print("║      • Preservar números: Mantiene los números (0-9)                        ║")
     print("║      • Preservar puntos: Mantiene los puntos (.)                            ║")
+    print("║      • Recursivo: Procesa también todas las subcarpetas (de abajo arriba)   ║")
+    print("║      • Hilos: Renombrados simultáneos, útil en unidades de red              ║")
+    print("║      • Archivos: Normaliza también los archivos, conservando la extensión   ║")
     print("║                                                                              ║")
     print("║  🛡️  SEGURIDAD:                                                              ║")
-    print("║      • Solo renombra carpetas, NO toca archivos                             ║")
+    print("║      • Solo renombra carpetas, salvo que actives la opción de archivos      ║")
     print("║      • No borra ni modifica contenido                                       ║")
     print("║      • Detecta conflictos antes de hacer cambios                            ║")
+    print("║      • Guarda un diario de cada renombrado para poder deshacerlo            ║")
     print("║                                                                              ║")
     print("║  💡 CONSEJO: Siempre haz una copia de seguridad antes de usar!              ║")
     print("║                                                                              ║")
     print("╚" + "═" * 78 + "╝")
     input("\nPresiona Enter para volver al menú...")
 
+# Códigos de salida del modo sin interfaz
+EXIT_OK = 0           # todo correcto
+EXIT_ERRORS = 1       # hubo conflictos o errores al renombrar
+EXIT_USAGE = 2        # argumentos inválidos o directorio inexistente
+
+def parse_arguments(argv):
+    """Interpreta los argumentos del modo sin interfaz (para tareas programadas)"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        prog="rename_folders",
+        description="Renombrador Universal de Carpetas - modo sin interfaz para tareas programadas. "
+                    "Sin argumentos se abre el menú interactivo.",
+        epilog="Códigos de salida: 0 = correcto, 1 = conflictos o errores, 2 = uso incorrecto.")
+    parser.add_argument("--path", help="Directorio cuyas carpetas se normalizan")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Solo muestra la vista previa, sin renombrar nada")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="Confirma el renombrado sin preguntar (obligatorio para aplicar cambios)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Procesa también todas las subcarpetas, de abajo hacia arriba")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Cantidad de renombrados simultáneos (por defecto 1)")
+    parser.add_argument("--undo", action="store_true",
+                        help="Deshace el último renombrado registrado en el diario")
+    parser.add_argument("--save-plan", metavar="ARCHIVO",
+                        help="Guarda el plan de renombrado en un archivo JSONL sin renombrar nada")
+    parser.add_argument("--apply-plan", metavar="ARCHIVO",
+                        help="Aplica un plan guardado con --save-plan (usa --path para cambiar la base)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Mide el tiempo de cada fase y la latencia de los renombrados y lo muestra en el resumen")
+    parser.add_argument("--metrics-file", metavar="ARCHIVO",
+                        help="Guarda las métricas en un archivo JSON (implica --metrics)")
+    
+    normalization = parser.add_argument_group("opciones de normalización")
+    normalization.add_argument("--keep-case", action="store_true",
+                               help="No convertir a minúsculas")
+    normalization.add_argument("--keep-accents", action="store_true",
+                               help="No eliminar acentos")
+    normalization.add_argument("--keep-spaces", action="store_true",
+                               help="No reemplazar espacios por _")
+    normalization.add_argument("--keep-special", action="store_true",
+                               help="No eliminar caracteres especiales")
+    normalization.add_argument("--drop-numbers", action="store_true",
+                               help="No preservar números")
+    normalization.add_argument("--preserve-dots", action="store_true",
+                               help="Preservar puntos")
+    normalization.add_argument("--suffix-collisions", choices=(SUFFIX_NUMBER, SUFFIX_HASH),
+                               help="Resolver las colisiones con un sufijo (_2, _3... o hash corto) "
+                                    "en lugar de omitirlas")
+    normalization.add_argument("--include-files", action="store_true",
+                               help="Normalizar también los nombres de archivo en la misma pasada "
+                                    "(la extensión se conserva con independencia de --preserve-dots)")
+    
+    args = parser.parse_args(argv)
+    if not args.undo and not args.apply_plan and not args.path:
+        parser.error("se requiere --path (o --undo / --apply-plan)")
+    if args.save_plan and args.apply_plan:
+        parser.error("--save-plan y --apply-plan no se pueden combinar")
+    if args.workers < 1:
+        parser.error("--workers debe ser 1 o mayor")
+    return args
+
+def options_from_arguments(args):
+    """Construye el diccionario de opciones a partir de los argumentos"""
+    return {
+        'lowercase': not args.keep_case,
+        'remove_accents': not args.keep_accents,
+        'replace_spaces': not args.keep_spaces,
+        'remove_special': not args.keep_special,
+        'preserve_numbers': not args.drop_numbers,
+        'preserve_dots': args.preserve_dots,
+        'collision_suffix': args.suffix_collisions,
+        'include_files': args.include_files,
+        'recursive': args.recursive,
+        'workers': args.workers
+    }
+
+def run_headless(argv):
+    """
+    Ejecuta el renombrado sin pantallas interactivas ni pausas.
+    Devuelve el código de salida del proceso.
+    """
+    args = parse_arguments(argv)
+    
+    # Evitar errores de codificación al redirigir la salida (cron, servicios)
+    try:
+        sys.stdout.reconfigure(errors='replace')
+    except Exception:
+        pass
+    
+    stats = {}
+    if args.metrics or args.metrics_file:
+        stats['metrics'] = RunMetrics()
+    
+    exit_code = run_headless_command(args, stats)
+    
+    if args.metrics_file:
+        try:
+            stats['metrics'].write(args.metrics_file)
+        except OSError as e:
+            print(f"❌ ERROR: No se pudieron guardar las métricas: {e}")
+            return exit_code or EXIT_ERRORS
+    return exit_code
+
+def run_headless_command(args, stats):
+    """Ejecuta la operación pedida en los argumentos; stats recibe los contadores"""
+    if args.undo:
+        journal = find_last_undoable_journal()
+        if journal is None:
+            print("ℹ️  INFO: No hay renombrados registrados para deshacer.")
+            return EXIT_OK
+        if not args.yes:
+            print(f"⚠️  Se desharían {len(journal['renames'])} renombrados en {journal['header'].get('base', '?')}.")
+            print("   Usa --yes para confirmar.")
+            return EXIT_USAGE
+        return EXIT_OK if undo_run(journal) else EXIT_ERRORS
+    
+    if args.apply_plan:
+        if not args.yes and not args.dry_run:
+            print("ℹ️  Sin --yes solo se comprueba el plan; no se renombrará nada.\n")
+        if not apply_plan(args.apply_plan, {'workers': args.workers}, stats, args.path,
+                          dry_run=not args.yes or args.dry_run):
+            return EXIT_USAGE
+        return EXIT_ERRORS if stats.get('errors') or stats.get('plan_truncated') or stats.get('cancelled') else EXIT_OK
+    
+    if not os.path.isdir(args.path):
+        print(f"❌ ERROR: El directorio no existe o no es un directorio: {args.path}")
+        return EXIT_USAGE
+    
+    incomplete = find_incomplete_journals()
+    if incomplete:
+        print(f"⚠️  Hay {len(incomplete)} renombrados interrumpidos sin resolver "
+              f"(ejecuta el programa sin argumentos para completarlos o revertirlos).")
+    
+    options = options_from_arguments(args)
+    
+    if args.save_plan:
+        if not save_plan(args.path, args.save_plan, options, stats):
+            return EXIT_ERRORS
+        return EXIT_ERRORS if stats.get('conflicts') else EXIT_OK
+    
+    if args.dry_run or not args.yes:
+        if not args.dry_run:
+            print("ℹ️  Sin --yes solo se muestra la vista previa; no se renombrará nada.\n")
+        if not preview_changes(args.path, options, stats):
+            return EXIT_ERRORS
+        return EXIT_ERRORS if stats.get('conflicts') else EXIT_OK
+    
+    if not rename_folders(args.path, options, stats):
+        return EXIT_ERRORS
+    return EXIT_ERRORS if stats.get('errors') or stats.get('cancelled') else EXIT_OK
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_headless(sys.argv[1:]))
     main()
@@ -0,0 +1,1991 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Renombrador Universal de Carpetas - Núcleo
+Motor de normalización compartido por la versión terminal y la GUI
+Sin dependencias de Tk ni efectos en consola
+Autor: rodrigoangeloni
+Fecha: 2025-06-01
+"""
+
+import errno
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+import stat
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import lru_cache, partial
+from pathlib import Path
+
+# Opciones de normalización por defecto
+DEFAULT_OPTIONS = {
+    'lowercase': True,
+    'remove_accents': True,
+    'replace_spaces': True,
+    'remove_special': True,
+    'preserve_numbers': True,
+    'preserve_dots': False,
+    'collision_suffix': None,
+    'include_files': False,
+    'recursive': False,
+    'workers': 1
+}
+
+# Orden de las claves que identifican un plan de normalización
+OPTION_KEYS = ('lowercase', 'remove_accents', 'replace_spaces',
+               'remove_special', 'preserve_numbers', 'preserve_dots')
+
+# Motivos de conflicto de un renombrado
+CONFLICT_EXISTS = 'exists'        # el nombre destino ya existe en el directorio
+CONFLICT_COLLISION = 'collision'  # varias carpetas del lote producen el mismo nombre
+CONFLICT_MISSING = 'missing'      # la carpeta de un plan guardado ya no existe
+
+CONFLICT_LABELS = {
+    CONFLICT_EXISTS: 'ya existe',
+    CONFLICT_COLLISION: 'colisión dentro del lote',
+    CONFLICT_MISSING: 'el origen ya no existe',
+}
+
+# Estrategias opcionales para desambiguar colisiones (opción 'collision_suffix');
+# None deja las colisiones como conflicto
+SUFFIX_NUMBER = 'number'  # nombre_2, nombre_3, ...
+SUFFIX_HASH = 'hash'      # nombre_1a2b3c (hash corto del nombre original)
+
+SUFFIX_LABELS = {
+    None: 'omitir (conflicto)',
+    SUFFIX_NUMBER: 'numerar (_2, _3, ...)',
+    SUFFIX_HASH: 'hash corto',
+}
+
+# Tipo de entrada de cada fila del plan; los archivos solo se planifican
+# con la opción 'include_files'
+KIND_FOLDER = 'folder'
+KIND_FILE = 'file'
+
+KIND_LABELS = {
+    KIND_FOLDER: 'carpetas',
+    KIND_FILE: 'archivos',
+}
+
+# Prefijo de los contadores de stats que solo cuentan archivos ('files_total', 'files_changes', ...)
+FILE_COUNTER_PREFIX = 'files_'
+
+# Aclaración de stats['stat_calls'] en los resúmenes: el lstat implícito de
+# os.DirEntry cuando el listado no informa el tipo no se puede contar
+STAT_CALLS_NOTE = "(sin los lstat implícitos de NFS/SMB/FUSE)"
+
+# Estado de cada fila del plan, tal como lo muestran las interfaces
+STATUS_UNCHANGED = 'unchanged'  # el nombre ya está normalizado
+STATUS_RENAME = 'rename'        # se renombrará
+STATUS_CONFLICT = 'conflict'    # se omitirá por conflicto
+
+# Contador de stats que acumula cada estado al recorrer el plan en flujo
+STATUS_COUNTERS = {
+    STATUS_UNCHANGED: 'unchanged',
+    STATUS_RENAME: 'changes',
+    STATUS_CONFLICT: 'conflicts',
+}
+
+# Resultado de cada fila al aplicar el plan con execute_renames
+RESULT_PENDING = 'pending'      # se va a renombrar; su resultado llega después
+RESULT_UNCHANGED = 'unchanged'  # no necesitaba cambios
+RESULT_CONFLICT = 'conflict'    # conflicto detectado al planificar
+RESULT_RENAMED = 'renamed'
+RESULT_EXISTS = 'exists'        # el destino apareció después de planificar
+RESULT_DENIED = 'denied'        # sin permisos
+RESULT_FAILED = 'failed'        # cualquier otro error
+
+# Contador de execute_renames que acumula cada resultado
+RESULT_COUNTERS = {
+    RESULT_UNCHANGED: 'skipped',
+    RESULT_CONFLICT: 'errors',
+    RESULT_RENAMED: 'renamed',
+    RESULT_EXISTS: 'errors',
+    RESULT_DENIED: 'errors',
+    RESULT_FAILED: 'errors',
+}
+
+# Expresiones regulares comunes a todos los planes
+_WHITESPACE_RE = re.compile(r'\s+')
+_UNDERSCORES_RE = re.compile(r'_+')
+
+def _strip_accents_slow(name):
+    """Elimina las marcas diacríticas (categoría Mn) del nombre, carácter a carácter"""
+    try:
+        name = unicodedata.normalize('NFD', name)
+        name = ''.join(char for char in name if unicodedata.category(char) != 'Mn')
+    except:
+        pass
+    return name
+
+class _AccentTable(dict):
+    """
+    Tabla para str.translate que asigna a cada punto de código su forma
+    sin acentos. Los puntos de código que aún no se han visto se calculan
+    la primera vez que aparecen y quedan guardados en la tabla.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        # Caracteres combinantes que sobreviven a la eliminación de acentos;
+        # NFD los reordena respecto a sus vecinos, así que los nombres que
+        # los contienen se procesan por la vía lenta para no alterar el orden
+        self.reorderable = set()
+    
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        stripped = _strip_accents_slow(char)
+        if any(unicodedata.combining(c) for c in stripped):
+            self.reorderable.add(char)
+        self[codepoint] = stripped
+        return stripped
+
+_ACCENT_TABLE = _AccentTable()
+
+# Precalcular Latin-1 y Latin Extendido A/B, que cubren los idiomas más habituales
+for _codepoint in range(0x80, 0x250):
+    _ACCENT_TABLE[_codepoint]
+del _codepoint
+
+def _strip_accents(name):
+    """Elimina las marcas diacríticas del nombre en una sola pasada con str.translate"""
+    if name.isascii():
+        return name
+    
+    stripped = name.translate(_ACCENT_TABLE)
+    reorderable = _ACCENT_TABLE.reorderable
+    if reorderable and not reorderable.isdisjoint(name):
+        return _strip_accents_slow(name)
+    return stripped
+
+def _strip_underscores(name):
+    """Elimina guiones bajos al inicio y final"""
+    return name.strip('_')
+
+class NormalizerPlan:
+    """
+    Plan de normalización compilado para un conjunto de opciones.
+    Contiene las expresiones regulares ya compiladas y la lista ordenada
+    de etapas activas, para no reconstruirlas en cada carpeta.
+    """
+    
+    def __init__(self, key):
+        self.key = key
+        options = dict(zip(OPTION_KEYS, key))
+        stages = []
+        
+        # Convertir a minúsculas si está habilitado
+        if options['lowercase']:
+            stages.append(('lowercase', str.lower))
+        
+        # Eliminar acentos si está habilitado
+        if options['remove_accents']:
+            stages.append(('remove_accents', _strip_accents))
+        
+        # Construir patrón de caracteres permitidos
+        allowed_chars = r'a-zA-Z'
+        
+        if options['preserve_numbers']:
+            allowed_chars += r'0-9'
+        
+        if options['preserve_dots']:
+            allowed_chars += r'\.'
+        
+        # Reemplazar espacios
+        if options['replace_spaces']:
+            stages.append(('replace_spaces', partial(_WHITESPACE_RE.sub, '_')))
+            allowed_chars += r'_'
+        else:
+            allowed_chars += r'\s'
+        
+        # Eliminar caracteres especiales si está habilitado
+        self.special_re = None
+        if options['remove_special']:
+            self.special_re = re.compile(f'[^{allowed_chars}]')
+            stages.append(('remove_special', partial(self.special_re.sub, '_')))
+        
+        # Limpiar múltiples guiones bajos y eliminarlos al inicio y final
+        stages.append(('collapse_underscores', partial(_UNDERSCORES_RE.sub, '_')))
+        stages.append(('strip_underscores', _strip_underscores))
+        
+        self.stages = tuple(stages)
+        self._functions = tuple(function for _, function in stages)
+        
+        # Los sufijos de colisión solo pueden llevar cifras si la normalización las conserva
+        self.keeps_digits = self._apply_stages('0123456789') == '0123456789'
+        
+        # Vía rápida: un nombre formado solo por caracteres ASCII que las
+        # etapas dejan intactos, separados por guiones bajos simples y sin
+        # guiones bajos en los extremos, ya está normalizado
+        token_chars = ''.join(char for char in map(chr, range(0x20, 0x7f))
+                              if char != '_' and self._apply_stages(char) == char)
+        token = '[' + ''.join(re.escape(char) for char in token_chars) + ']+'
+        self.canonical_re = re.compile(f'(?:{token}_)*{token}')
+        self._is_canonical = self.canonical_re.fullmatch
+    
+    def _apply_stages(self, name):
+        """Aplica las etapas del plan sin comprobaciones previas"""
+        for function in self._functions:
+            name = function(name)
+        return name
+    
+    def is_canonical(self, name):
+        """Indica si el nombre ya está normalizado según este plan (comprobación conservadora)"""
+        return isinstance(name, str) and self._is_canonical(name) is not None
+    
+    def normalize(self, name):
+        """Normaliza un nombre aplicando las etapas del plan en orden"""
+        if not name or not isinstance(name, str):
+            return 'unnamed_folder'
+        
+        if self._is_canonical(name):
+            return name
+        
+        # Si el nombre queda vacío, usar un nombre por defecto
+        return self._apply_stages(name) or 'unnamed_folder'
+    
+    def normalize_many(self, names, stats=None, default='unnamed_folder'):
+        """
+        Normaliza un lote de nombres conservando el orden.
+        Si se pasa un diccionario stats, acumula en stats['fast_path']
+        cuántos nombres ya estaban normalizados.
+        default sustituye a los nombres que quedan vacíos.
+        """
+        is_canonical = self._is_canonical
+        apply_stages = self._apply_stages
+        results = []
+        fast_path = 0
+        
+        for name in names:
+            if not name or not isinstance(name, str):
+                results.append(default)
+            elif is_canonical(name):
+                results.append(name)
+                fast_path += 1
+            else:
+                results.append(apply_stages(name) or default)
+        
+        if stats is not None:
+            stats['fast_path'] = stats.get('fast_path', 0) + fast_path
+        return results
+
+def options_key(options=None):
+    """Convierte un diccionario de opciones en una clave inmutable y hashable"""
+    if options is None:
+        options = DEFAULT_OPTIONS
+    return tuple(bool(options.get(key, DEFAULT_OPTIONS[key])) for key in OPTION_KEYS)
+
+@lru_cache(maxsize=None)
+def _build_normalizer_plan(key):
+    """Construye (una sola vez por clave) el plan de normalización"""
+    return NormalizerPlan(key)
+
+def get_normalizer_plan(options=None):
+    """Obtiene el plan de normalización compilado para las opciones dadas"""
+    return _build_normalizer_plan(options_key(options))
+
+def normalize_folder_name(name, options=None):
+    """
+    Normaliza el nombre de la carpeta según las opciones especificadas
+    """
+    return get_normalizer_plan(options).normalize(name)
+
+def normalize_many(names, options=None, stats=None):
+    """
+    Normaliza una lista (o cualquier iterable) de nombres en una sola llamada.
+    Las opciones y el plan compilado se resuelven una única vez para todo el lote.
+    Devuelve los resultados en el mismo orden.
+    """
+    return get_normalizer_plan(options).normalize_many(names, stats)
+
+def split_extension(name):
+    """
+    Separa un nombre de archivo en (base, extensión sin el punto).
+    Solo cuenta el último punto, y no el inicial de un archivo oculto ('.bashrc').
+    """
+    stem, extension = os.path.splitext(name)
+    return stem, extension[1:]
+
+def normalize_file_names(names, options=None, stats=None):
+    """
+    Normaliza un lote de nombres de archivo conservando el orden.
+    La base se normaliza igual que un nombre de carpeta y la extensión por
+    separado, de modo que el punto que las separa se conserva siempre, con
+    independencia de 'preserve_dots' ('Foto Playa.JPG' → 'foto_playa.jpg').
+    Una extensión que queda vacía se descarta. Los puntos iniciales de un
+    archivo oculto se conservan ('.Mi Config' → '.mi_config').
+    """
+    plan = get_normalizer_plan(options)
+    parts = [split_extension(name) for name in names]
+    hidden = [stem[:len(stem) - len(stem.lstrip('.'))] for stem, _ in parts]
+    stems = plan.normalize_many([stem.lstrip('.') for stem, _ in parts], stats, default='unnamed_file')
+    extensions = plan.normalize_many([extension for _, extension in parts], default='')
+    results = []
+    for name, prefix, (stem, _), new_stem, extension in zip(names, hidden, parts, stems, extensions):
+        if prefix and stem == prefix:
+            # Solo puntos: no hay nada que normalizar
+            results.append(name)
+            continue
+        new_stem = prefix + new_stem
+        results.append(f"{new_stem}.{extension}" if extension else new_stem)
+    return results
+
+def _count(stats, key, amount=1):
+    """Incrementa un contador del diccionario de estadísticas, si se proporcionó"""
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + amount
+
+def _count_row(stats, item, counter):
+    """Cuenta una fila del plan en counter y, si es un archivo, también en su contador de archivos"""
+    _count(stats, counter)
+    if item.get('kind') == KIND_FILE:
+        _count(stats, FILE_COUNTER_PREFIX + counter)
+
+def count_by_kind(stats):
+    """
+    Separa por tipo de entrada los contadores del plan acumulados en stats.
+    Devuelve {KIND_FOLDER: contadores, KIND_FILE: contadores}, cada uno con
+    'total', 'changes', 'conflicts' y 'unchanged'.
+    """
+    keys = ('total',) + tuple(STATUS_COUNTERS.values())
+    files = {key: stats.get(FILE_COUNTER_PREFIX + key, 0) for key in keys}
+    folders = {key: stats.get(key, 0) - files[key] for key in keys}
+    return {KIND_FOLDER: folders, KIND_FILE: files}
+
+# Fases instrumentadas por RunMetrics
+METRIC_LISTING = 'listing'      # listar directorios (scandir y firma)
+METRIC_NORMALIZE = 'normalize'  # normalizar nombres
+METRIC_CHECKS = 'checks'        # comprobaciones de existencia (stat/lstat)
+METRIC_RENAME = 'rename'        # llamadas rename del sistema
+
+METRIC_LABELS = {
+    METRIC_LISTING: 'Listado',
+    METRIC_NORMALIZE: 'Normalización',
+    METRIC_CHECKS: 'Comprobaciones',
+    METRIC_RENAME: 'Renombrado',
+}
+
+METRIC_PERCENTILES = (50, 95, 99)
+
+class RunMetrics:
+    """
+    Instrumentación opcional de una ejecución: tiempo acumulado y cantidad de
+    llamadas por fase, y latencia de cada operación individual (renombrados)
+    para calcular percentiles.
+    Se activa guardando una instancia en stats['metrics']; sin ella las
+    funciones del núcleo no miden nada (una consulta al dict por directorio).
+    Es segura entre hilos: los renombrados en paralelo registran su latencia.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}     # fase -> [segundos, llamadas]
+        self.latencies = {}  # operación -> array('d') de segundos
+        self._lock = threading.Lock()
+    
+    def add(self, phase, seconds, calls=1):
+        """Suma tiempo y llamadas a una fase"""
+        with self._lock:
+            totals = self.phases.setdefault(phase, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+    
+    def record(self, operation, seconds):
+        """Registra la latencia de una operación (también cuenta en su fase)"""
+        with self._lock:
+            self.latencies.setdefault(operation, array('d')).append(seconds)
+            totals = self.phases.setdefault(operation, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+    
+    def summary(self):
+        """
+        Devuelve un dict serializable con 'elapsed' (segundos desde que se creó),
+        'phases' ({fase: {'seconds', 'calls'}}) y 'latencies'
+        ({operación: {'count', 'mean', 'max', 'p50', 'p95', 'p99'}}, en segundos).
+        """
+        with self._lock:
+            phases = {phase: {'seconds': seconds, 'calls': calls}
+                      for phase, (seconds, calls) in self.phases.items()}
+            samples = {operation: sorted(values) for operation, values in self.latencies.items()}
+        
+        latencies = {}
+        for operation, values in samples.items():
+            if not values:
+                continue
+            summary = {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'max': values[-1],
+            }
+            for percentile in METRIC_PERCENTILES:
+                # Percentil por rango más cercano
+                rank = max(1, math.ceil(percentile / 100 * len(values)))
+                summary[f'p{percentile}'] = values[rank - 1]
+            latencies[operation] = summary
+        
+        return {
+            'elapsed': time.perf_counter() - self.started,
+            'phases': phases,
+            'latencies': latencies,
+        }
+    
+    def write(self, path):
+        """Guarda summary() como JSON en path"""
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(self.summary(), output, ensure_ascii=False, indent=2)
+            output.write('\n')
+
+def _metrics(stats):
+    """Devuelve el RunMetrics de stats, o None si la instrumentación está desactivada"""
+    return stats.get('metrics') if stats is not None else None
+
+# Operaciones relativas a un descriptor de directorio (openat, fstatat, renameat):
+# el núcleo resuelve cada nombre desde el directorio ya abierto en lugar de
+# recorrer de nuevo la ruta completa. No disponibles en Windows.
+DIR_FD_SUPPORTED = (os.open in os.supports_dir_fd and os.stat in os.supports_dir_fd
+                    and os.rename in os.supports_dir_fd and os.scandir in os.supports_fd
+                    and hasattr(os, 'O_DIRECTORY'))
+
+# Máximo de descriptores de directorio abiertos a la vez por recorrido o
+# renombrado; más allá (árboles muy profundos) se vuelve a usar la ruta completa
+MAX_DIR_FDS = 64
+
+_DIR_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_CLOEXEC', 0)
+
+def open_directory(path, dir_fd=None):
+    """
+    Abre un directorio para operar relativo a él. Con dir_fd, path es un nombre
+    dentro de ese directorio y no se siguen enlaces simbólicos.
+    """
+    if dir_fd is None:
+        return os.open(path, _DIR_FLAGS)
+    return os.open(path, _DIR_FLAGS | getattr(os, 'O_NOFOLLOW', 0), dir_fd=dir_fd)
+
+def _lexists_at(name, dir_fd):
+    """os.path.lexists de un nombre relativo a un directorio abierto"""
+    try:
+        os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+    except (OSError, ValueError):
+        return False
+    return True
+
+class DirectoryHandles:
+    """
+    Caché acotada de descriptores de los directorios donde se renombra, para
+    que cada rename se resuelva relativo al directorio (renameat) en lugar de
+    recorrer la ruta absoluta. Es segura entre hilos; un descriptor en uso no
+    se cierra, y si todos lo están acquire() devuelve None (se usa la ruta).
+    """
+    
+    def __init__(self, limit=MAX_DIR_FDS):
+        self.limit = limit
+        self._handles = OrderedDict()  # ruta -> [descriptor, usos en curso]
+        self._lock = threading.Lock()
+    
+    def acquire(self, path):
+        """Devuelve el descriptor del directorio path (o None) y lo marca en uso"""
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None:
+                self._handles.move_to_end(path)
+                handle[1] += 1
+                return handle[0]
+        
+        # Abrir y cerrar descriptores fuera del cerrojo para no frenar al resto de hilos
+        try:
+            fd = open_directory(path)
+        except OSError:
+            return None
+        unused = []
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is not None:
+                # Otro hilo abrió el mismo directorio a la vez: se usa el suyo
+                self._handles.move_to_end(path)
+                unused.append(fd)
+            elif len(self._handles) < self.limit or self._evict(unused):
+                handle = self._handles[path] = [fd, 0]
+            else:
+                unused.append(fd)
+            if handle is not None:
+                handle[1] += 1
+        for unused_fd in unused:
+            os.close(unused_fd)
+        return handle[0] if handle is not None else None
+    
+    def release(self, path):
+        """Deja de usar el descriptor obtenido con acquire()"""
+        with self._lock:
+            self._handles[path][1] -= 1
+    
+    def discard(self, path):
+        """Olvida el directorio path (se acaba de renombrar) si no está en uso"""
+        with self._lock:
+            handle = self._handles.get(path)
+            if handle is None or handle[1]:
+                return
+            del self._handles[path]
+        os.close(handle[0])
+    
+    def close(self):
+        """Cierra todos los descriptores"""
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for fd, _ in handles:
+            os.close(fd)
+    
+    def _evict(self, closed):
+        """Saca de la caché el descriptor libre más antiguo y lo añade a closed para cerrarlo"""
+        for path, (fd, users) in self._handles.items():
+            if not users:
+                del self._handles[path]
+                closed.append(fd)
+                return True
+        return False
+
+def scan_directory(directory_path, stats=None):
+    """
+    Recorre las entradas de un directorio con os.scandir y las genera como flujo.
+    directory_path puede ser una ruta o un descriptor de directorio abierto.
+    Produce tuplas (entrada, es_directorio) usando el tipo que devuelve el
+    propio listado (d_type); solo se emite un stat para seguir enlaces
+    simbólicos. Los stat emitidos se acumulan en stats['stat_calls']; el lstat
+    implícito de os.DirEntry cuando el tipo es desconocido (DT_UNKNOWN, en
+    NFS, SMB o FUSE) no es observable y no se cuenta.
+    """
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            _count(stats, 'entries')
+            try:
+                if entry.is_symlink():
+                    # Igual que Path.is_dir(): se sigue el enlace hasta el destino
+                    _count(stats, 'stat_calls')
+                    is_dir = stat.S_ISDIR(entry.stat().st_mode)
+                else:
+                    # Sin coste extra cuando el sistema informa el tipo en el listado;
+                    # si el tipo es desconocido, os.DirEntry recurre a lstat internamente
+                    is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            yield entry, is_dir
+
+def list_directory(directory_path, stats=None, signature=None, dir_fd=None):
+    """
+    Lista un directorio una sola vez.
+    Devuelve (entradas, subcarpetas): entradas es una lista de tuplas
+    (nombre, es_directorio) con todo el contenido, y subcarpetas los nombres
+    de las carpetas reales (no enlaces simbólicos) que se pueden recorrer.
+    Si se pasa un dict signature, se anota en él la fecha de modificación del
+    directorio (tomada antes de listarlo) para detectar cambios posteriores.
+    Si se pasa dir_fd (el directorio ya abierto), se lista y consulta a través
+    de él sin volver a resolver la ruta.
+    """
+    metrics = _metrics(stats)
+    if metrics is not None:
+        started = time.perf_counter()
+    if signature is not None:
+        _count(stats, 'stat_calls')
+        status = os.stat(directory_path) if dir_fd is None else os.fstat(dir_fd)
+        signature[str(directory_path)] = status.st_mtime_ns
+    entries = []
+    subdirs = []
+    for entry, is_dir in scan_directory(directory_path if dir_fd is None else dir_fd, stats):
+        entries.append((entry.name, is_dir))
+        if is_dir and not entry.is_symlink():
+            subdirs.append(entry.name)
+    if metrics is not None:
+        metrics.add(METRIC_LISTING, time.perf_counter() - started)
+    return entries, subdirs
+
+def walk_bottom_up(directory_path, stats=None, signature=None):
+    """
+    Recorre el subárbol en postorden (las subcarpetas antes que su padre) como generador.
+    Produce tuplas (ruta, profundidad, entradas); el directorio raíz se produce al final.
+    """
+    root = str(directory_path)
+    root_fd = open_directory(root) if DIR_FD_SUPPORTED else None
+    try:
+        entries, subdirs = list_directory(root, stats, signature, root_fd)
+    except BaseException:
+        if root_fd is not None:
+            os.close(root_fd)
+        raise
+    stack = [(root, 0, entries, iter(subdirs), root_fd)]
+    open_fds = 0 if root_fd is None else 1
+    
+    try:
+        while stack:
+            path, depth, entries, pending, fd = stack[-1]
+            name = next(pending, None)
+            
+            if name is None:
+                stack.pop()
+                if fd is not None:
+                    os.close(fd)
+                    open_fds -= 1
+                yield path, depth, entries
+                continue
+            
+            child = os.path.join(path, name)
+            child_fd = None
+            try:
+                if fd is not None and open_fds < MAX_DIR_FDS:
+                    child_fd = open_directory(name, fd)
+                    open_fds += 1
+                child_entries, child_subdirs = list_directory(child, stats, signature, child_fd)
+            except OSError:
+                if child_fd is not None:
+                    os.close(child_fd)
+                    open_fds -= 1
+                _count(stats, 'scan_errors')
+                continue
+            stack.append((child, depth + 1, child_entries, iter(child_subdirs), child_fd))
+    finally:
+        # Generador abandonado o error: cerrar los descriptores que sigan abiertos
+        for _, _, _, _, fd in stack:
+            if fd is not None:
+                os.close(fd)
+
+# Prefijo de los nombres temporales con los que se rompen los ciclos de renombrado
+TEMPORARY_PREFIX = '.renombrando-'
+
+def _temporary_name(is_taken, chosen):
+    """Primer nombre temporal libre del directorio (sin consultar el disco)"""
+    number = 1
+    while True:
+        name = f"{TEMPORARY_PREFIX}{number}"
+        key = os.path.normcase(name)
+        if key not in chosen and not is_taken(name):
+            chosen.add(key)
+            return name
+        number += 1
+
+def schedule_renames(moves, is_taken):
+    """
+    Ordena los renombrados {original: nuevo} de un directorio según sus dependencias.
+    Devuelve (orden, after, via): after indica qué carpeta libera antes cada
+    destino y via el nombre temporal de la carpeta que rompe cada ciclo.
+    """
+    sources = {os.path.normcase(name): name for name in moves}
+    blockers = {}
+    dependents = {}
+    for name, new_name in moves.items():
+        blocker = sources.get(os.path.normcase(new_name))
+        if blocker is not None and blocker != name:
+            blockers[name] = blocker
+            dependents[blocker] = name
+    
+    if not blockers:
+        return list(moves), {}, {}
+    
+    order = []
+    after = {}
+    via = {}
+    placed = set()
+    temporaries = set()
+    for name in moves:
+        if name in placed:
+            continue
+        if name not in blockers and name not in dependents:
+            placed.add(name)
+            order.append(name)
+            continue
+        
+        # Retroceder hasta la carpeta cuyo destino está libre (cadena) o volver a name (ciclo)
+        head = name
+        while head in blockers and blockers[head] != name:
+            head = blockers[head]
+        if head in blockers:
+            # Ciclo: name se aparta a un nombre temporal y va a su destino al final
+            via[name] = _temporary_name(is_taken, temporaries)
+            head = name
+        
+        current = head
+        while current is not None and current not in placed:
+            placed.add(current)
+            order.append(current)
+            if current != head:
+                after[current] = blockers[current]
+            current = dependents.get(current)
+    
+    return order, after, via
+
+# Cifras de los sufijos cuando la normalización elimina los números (0-9 → g-p)
+_LETTER_DIGITS = str.maketrans('0123456789', 'ghijklmnop')
+
+def _suffix_number(number, digits=True):
+    """Texto del sufijo número number: '2', o 'b' si no se conservan los números"""
+    if digits:
+        return str(number)
+    letters = ''
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(ord('a') + remainder) + letters
+    return letters
+
+def _suffixed_name(name, original_name, strategy, taken, counters, extension='', digits=True):
+    """
+    Primer nombre con sufijo libre para original_name (ver assign_unique_names).
+    extension ('.jpg') se mantiene después del sufijo; con digits=False el
+    sufijo no lleva cifras, para que la normalización no lo elimine.
+    """
+    own_key = os.path.normcase(original_name)
+    if strategy == SUFFIX_HASH:
+        digest = hashlib.sha1(original_name.encode('utf-8', 'surrogatepass')).hexdigest()[:6]
+        if not digits:
+            digest = digest.translate(_LETTER_DIGITS)
+        candidate = f"{name}_{digest}{extension}"
+        if os.path.normcase(candidate) not in taken or os.path.normcase(candidate) == own_key:
+            return candidate
+        # Coincidencia improbable: se numera a partir del nombre con hash
+        name = f"{name}_{digest}"
+    
+    key = os.path.normcase(name + extension)
+    number = counters.get(key, 1)
+    while True:
+        number += 1
+        candidate = f"{name}_{_suffix_number(number, digits)}{extension}"
+        candidate_key = os.path.normcase(candidate)
+        if candidate_key not in taken or candidate_key == own_key:
+            counters[key] = number
+            return candidate
+
+def assign_unique_names(folder_names, new_names, siblings, strategy, stats=None, files=(), digits=True):
+    """
+    Resuelve en memoria las colisiones de un directorio con un sufijo
+    (SUFFIX_NUMBER o SUFFIX_HASH) y devuelve la lista de nombres nuevos.
+    digits=False genera sufijos sin cifras (opciones que eliminan los números).
+    """
+    groups = {}
+    for original_name, new_name in zip(folder_names, new_names):
+        if original_name != new_name:
+            groups.setdefault(os.path.normcase(new_name), []).append(original_name)
+    
+    clashing = {}
+    for key, sources in groups.items():
+        occupant = siblings.get(key)
+        if len(sources) > 1 or (occupant is not None and occupant not in sources):
+            clashing[key] = sources
+    if not clashing:
+        return new_names
+    
+    planned = dict(zip(folder_names, new_names))
+    taken = set(siblings).union(groups)
+    counters = {}
+    assigned = {}
+    for key in sorted(clashing):
+        sources = sorted(clashing[key])
+        target = planned[sources[0]]
+        occupant = siblings.get(key)
+        if occupant is None:
+            keeper = sources[0]
+        elif occupant in sources:
+            keeper = occupant
+        else:
+            keeper = None
+        
+        for original_name in sources:
+            if original_name == keeper:
+                continue
+            stem, extension = target, ''
+            if original_name in files:
+                stem, extension = split_extension(target)
+                extension = f".{extension}" if extension else ''
+            name = _suffixed_name(stem, original_name, strategy, taken, counters, extension, digits)
+            taken.add(os.path.normcase(name))
+            assigned[original_name] = name
+            _count(stats, 'suffixed')
+    
+    return [assigned.get(name, new_name) for name, new_name in zip(folder_names, new_names)]
+
+def stream_directory_plan(directory_path, entries, options=None, stats=None, depth=0):
+    """
+    Calcula en flujo el plan de renombrado de un directorio a partir de su listado.
+    Devuelve (cantidad, grupos de colisión, generador de filas del plan).
+    """
+    names = []
+    files = set()
+    siblings = {}
+    include_files = bool(options and options.get('include_files'))
+    
+    for name, is_dir in entries:
+        # normcase: en sistemas sin distinción de mayúsculas "Musica" y "musica" chocan
+        siblings[os.path.normcase(name)] = name
+        if is_dir:
+            names.append(name)
+        elif include_files:
+            names.append(name)
+            files.add(name)
+    
+    metrics = _metrics(stats)
+    if metrics is not None:
+        started = time.perf_counter()
+    if files:
+        folder_names = iter(normalize_many([name for name in names if name not in files], options, stats))
+        file_names = iter(normalize_file_names([name for name in names if name in files], options, stats))
+        new_names = [next(file_names if name in files else folder_names) for name in names]
+    else:
+        new_names = normalize_many(names, options, stats)
+    if metrics is not None:
+        metrics.add(METRIC_NORMALIZE, time.perf_counter() - started, len(names))
+    
+    strategy = options.get('collision_suffix') if options else None
+    if strategy:
+        new_names = assign_unique_names(names, new_names, siblings, strategy, stats, files,
+                                        get_normalizer_plan(options).keeps_digits)
+    
+    # Agrupar los renombrados por destino para detectar colisiones del lote
+    targets = {}
+    for original_name, new_name in zip(names, new_names):
+        if original_name != new_name:
+            targets.setdefault(os.path.normcase(new_name), []).append(original_name)
+    
+    # Resolver los conflictos antes de generar filas, para que los grupos
+    # estén completos cuando se muestra la primera
+    renamed = {name for name, new_name in zip(names, new_names)
+               if name != new_name and len(targets[os.path.normcase(new_name)]) == 1}
+    conflicts = {}
+    waiting = {}
+    for original_name, new_name in zip(names, new_names):
+        conflict = None
+        if original_name != new_name:
+            key = os.path.normcase(new_name)
+            existing = siblings.get(key)
+            if existing == original_name:
+                # Solo cambia la capitalización en un sistema sin distinción de mayúsculas
+                existing = None
+            if existing is not None and existing not in renamed:
+                conflict = CONFLICT_EXISTS
+            elif len(targets[key]) > 1:
+                conflict = CONFLICT_COLLISION
+            elif existing is not None:
+                # El destino lo ocupa otra carpeta que también se renombra
+                waiting[original_name] = existing
+        conflicts[original_name] = conflict
+    
+    # Si la carpeta que ocupa el destino no se puede mover, el destino sigue ocupado
+    blocked = True
+    while blocked:
+        blocked = False
+        for name, existing in list(waiting.items()):
+            if conflicts[existing] is not None:
+                conflicts[name] = CONFLICT_EXISTS
+                del waiting[name]
+                blocked = True
+    
+    groups = {}
+    for original_name, new_name in zip(names, new_names):
+        if conflicts[original_name]:
+            key = os.path.normcase(new_name)
+            if key not in groups:
+                existing = siblings.get(key)
+                if conflicts[original_name] != CONFLICT_EXISTS or existing == original_name:
+                    existing = None
+                groups[key] = {
+                    'target': new_name,
+                    'existing': existing,
+                    'sources': targets[key],
+                }
+    
+    # Orden de ejecución: solo cambia si hay cadenas o ciclos de renombrados
+    after = via = {}
+    if waiting:
+        moves = {name: new_name for name, new_name in zip(names, new_names)
+                 if name != new_name and not conflicts[name]}
+        taken = set(siblings).union(targets)
+        order, after, via = schedule_renames(moves, lambda name: os.path.normcase(name) in taken)
+        planned = dict(zip(names, new_names))
+        scheduled = iter(order)
+        names = [next(scheduled) if name in moves else name for name in names]
+        new_names = [planned[name] for name in names]
+    
+    def rows():
+        base_path = Path(directory_path)
+        count = len(names)
+        for index, (original_name, new_name) in enumerate(zip(names, new_names), 1):
+            conflict = conflicts[original_name]
+            if conflict:
+                status = STATUS_CONFLICT
+            elif original_name != new_name:
+                status = STATUS_RENAME
+            else:
+                status = STATUS_UNCHANGED
+            
+            yield {
+                'folder': base_path / original_name,
+                'original_name': original_name,
+                'new_name': new_name,
+                'will_change': original_name != new_name,
+                'has_conflict': conflict is not None,
+                'conflict': conflict,
+                'status': status,
+                'depth': depth,
+                'index': index,
+                'count': count,
+                'groups': groups,
+                'after': after.get(original_name),
+                'via': via.get(original_name),
+                'kind': KIND_FILE if original_name in files else KIND_FOLDER,
+            }
+    
+    return len(names), groups, rows()
+
+def iter_listings(directory_path, stats=None, recursive=False, signature=None):
+    """
+    Genera los listados que planifica iter_plan_rows como tuplas
+    (ruta, profundidad, entradas): solo el directorio indicado o, en modo
+    recursivo, todo el subárbol en postorden. Conservarlos permite volver a
+    planificar con otras opciones sin tocar el disco (por ejemplo, en la GUI).
+    """
+    if recursive:
+        yield from walk_bottom_up(directory_path, stats, signature)
+    else:
+        yield str(directory_path), 0, list_directory(directory_path, stats, signature)[0]
+
+def iter_plan_rows(directory_path, options=None, stats=None, recursive=False, signature=None,
+                   listings=None):
+    """
+    Genera en flujo las filas del plan de todo el recorrido (en postorden si es
+    recursivo) y acumula en stats los contadores del resumen.
+    """
+    if listings is None:
+        listings = iter_listings(directory_path, stats, recursive, signature)
+    
+    for path, depth, entries in listings:
+        count, groups, rows = stream_directory_plan(path, entries, options, stats, depth)
+        if not count:
+            continue
+        _count(stats, 'conflict_groups', len(groups))
+        for item in rows:
+            _count_row(stats, item, 'total')
+            _count_row(stats, item, STATUS_COUNTERS[item['status']])
+            yield item
+
+def signature_changed(signature, stats=None):
+    """
+    Comprueba de forma barata si algún directorio listado cambió desde que se
+    tomó la firma: un stat por directorio en lugar de volver a listar y normalizar.
+    Crear, borrar o renombrar una entrada actualiza la fecha de modificación del
+    directorio que la contiene; en sistemas de archivos con fechas de baja
+    resolución (FAT) un cambio en el mismo instante del listado puede pasar inadvertido.
+    """
+    metrics = _metrics(stats)
+    if metrics is not None:
+        started = time.perf_counter()
+    checked = 0
+    try:
+        for path, mtime in signature.items():
+            _count(stats, 'stat_calls')
+            checked += 1
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+    finally:
+        if metrics is not None:
+            metrics.add(METRIC_CHECKS, time.perf_counter() - started, checked)
+
+# Fases de una ejecución, tal como las informa ProgressTracker
+PHASE_SCAN = 'scan'    # listando directorios del disco
+PHASE_PLAN = 'plan'    # calculando nombres sobre listados ya leídos
+PHASE_APPLY = 'apply'  # renombrando
+
+PHASE_LABELS = {
+    PHASE_SCAN: 'Analizando',
+    PHASE_PLAN: 'Planificando',
+    PHASE_APPLY: 'Renombrando',
+}
+
+class ProgressTracker:
+    """
+    Seguimiento de progreso compartido por la terminal y la GUI.
+    Cuenta los elementos procesados en la fase actual y calcula el ritmo
+    (elementos/s) y el tiempo restante cuando se conoce el total. Es seguro
+    entre hilos: advance() se puede llamar desde los hilos de renombrado.
+    El callback recibe un snapshot() como mucho cada 'interval' segundos
+    (y siempre al cambiar de fase o terminar), en el hilo que avanza.
+    cancel() solicita una cancelación cooperativa: apply_renames deja de
+    tomar filas nuevas y termina los renombrados ya iniciados.
+    """
+    
+    def __init__(self, callback=None, interval=0.2):
+        self.callback = callback
+        self.interval = interval
+        self.phase = None
+        self.total = None
+        self.done = 0
+        self.started = time.monotonic()
+        self._last_report = 0.0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+    
+    def start_phase(self, phase, total=None):
+        """Comienza una fase; total es None si no se conoce de antemano"""
+        with self._lock:
+            self.phase = phase
+            self.total = total
+            self.done = 0
+            self.started = time.monotonic()
+        self._report(force=True)
+    
+    def add_total(self, amount):
+        """Amplía el total de la fase actual cuando se va conociendo sobre la marcha"""
+        with self._lock:
+            self.total = (self.total or 0) + amount
+    
+    def advance(self, amount=1):
+        """Suma elementos procesados en la fase actual"""
+        with self._lock:
+            self.done += amount
+        self._report()
+    
+    def finish(self):
+        """Informa el estado final de la fase actual"""
+        self._report(force=True)
+    
+    def cancel(self):
+        """Solicita detener la ejecución entre renombrados"""
+        self._cancel.set()
+    
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+    
+    def snapshot(self):
+        """
+        Devuelve un dict con 'phase', 'done', 'total', 'elapsed', 'rate'
+        (elementos/s), 'eta' (segundos restantes o None), 'fraction' (0-1 o
+        None) y 'cancelled'.
+        """
+        with self._lock:
+            phase, total, done = self.phase, self.total, self.done
+            elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        fraction = eta = None
+        if total:
+            fraction = min(1.0, done / total)
+            if rate > 0:
+                eta = max(0.0, (total - done) / rate)
+        return {
+            'phase': phase,
+            'done': done,
+            'total': total,
+            'elapsed': elapsed,
+            'rate': rate,
+            'eta': eta,
+            'fraction': fraction,
+            'cancelled': self.cancelled,
+        }
+    
+    def _report(self, force=False):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        self.callback(self.snapshot())
+
+def format_progress(snapshot):
+    """Texto de una línea para un snapshot de ProgressTracker"""
+    text = f"{PHASE_LABELS.get(snapshot['phase'], '')} {snapshot['done']}"
+    if snapshot['total']:
+        text += f"/{snapshot['total']} ({snapshot['fraction'] * 100:.0f}%)"
+    text += f" · {snapshot['rate']:.0f}/s"
+    if snapshot['eta'] is not None:
+        minutes, seconds = divmod(int(snapshot['eta'] + 0.5), 60)
+        text += f" · quedan {minutes:02d}:{seconds:02d}"
+    if snapshot['cancelled']:
+        text += " · cancelando…"
+    return text
+
+# renameat2(2) de Linux: flag que hace fallar el rename si el destino existe
+RENAME_NOREPLACE = 1
+_AT_FDCWD = -100
+
+_renameat2 = None        # función de libc, cargada en el primer uso
+_renameat2_loaded = False
+_renameat2_rejected = set()  # st_dev de los sistemas de archivos que no admiten RENAME_NOREPLACE
+
+def _load_renameat2():
+    """Devuelve renameat2 de libc (vía ctypes) o None si no está disponible"""
+    global _renameat2, _renameat2_loaded
+    if not _renameat2_loaded:
+        _renameat2_loaded = True
+        if sys.platform.startswith('linux'):
+            try:
+                import ctypes
+                function = ctypes.CDLL(None, use_errno=True).renameat2
+            except (ImportError, OSError, AttributeError):
+                function = None
+            if function is not None:
+                function.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+                function.restype = ctypes.c_int
+                _renameat2 = (function, ctypes.get_errno)
+    return _renameat2
+
+def atomic_renames_available():
+    """Indica si rename_noreplace puede usar renameat2 (sin comprobación previa del destino)"""
+    return _load_renameat2() is not None
+
+def _same_entry(source, target, dir_fd=None):
+    """Indica si source y target son la misma entrada (cambio de mayúsculas en un sistema sin distinción)"""
+    try:
+        first = os.stat(source, dir_fd=dir_fd, follow_symlinks=False)
+        second = os.stat(target, dir_fd=dir_fd, follow_symlinks=False)
+    except OSError:
+        return False
+    return (first.st_ino, first.st_dev) == (second.st_ino, second.st_dev)
+
+def _parent_device(path, dir_fd=None):
+    """st_dev del directorio que contiene path (o del directorio abierto dir_fd)"""
+    try:
+        if dir_fd is not None:
+            return os.fstat(dir_fd).st_dev
+        return os.stat(os.path.dirname(os.fspath(path)) or '.').st_dev
+    except OSError:
+        return None
+
+def rename_noreplace(source, target, dir_fd=None):
+    """
+    Renombra source a target sin reemplazar nunca un destino existente;
+    lanza FileExistsError si ya existe. Con dir_fd, ambos son nombres dentro de ese directorio.
+    """
+    global _renameat2
+    renameat2 = _load_renameat2()
+    if renameat2 is not None and _renameat2_rejected and _parent_device(source, dir_fd) in _renameat2_rejected:
+        renameat2 = None
+    rejected = False
+    if renameat2 is not None:
+        function, get_errno = renameat2
+        base = _AT_FDCWD if dir_fd is None else dir_fd
+        if function(base, os.fsencode(source), base, os.fsencode(target), RENAME_NOREPLACE) == 0:
+            return
+        code = get_errno()
+        if code == errno.ENOSYS:
+            # Núcleo sin la llamada: no volver a intentarlo
+            _renameat2 = None
+        elif code in (errno.EINVAL, errno.EOPNOTSUPP):
+            rejected = True
+        elif not (code == errno.EEXIST and _same_entry(source, target, dir_fd)):
+            raise OSError(code, os.strerror(code), str(source), None, str(target))
+    
+    if dir_fd is None:
+        exists = os.path.lexists(target)
+    else:
+        exists = _lexists_at(target, dir_fd)
+    if exists and not _same_entry(source, target, dir_fd):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(source), None, str(target))
+    os.rename(source, target, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+    if rejected:
+        # os.rename sí funcionó: el rechazo era del flag, no volver a pedirlo en este sistema de archivos
+        device = _parent_device(target, dir_fd)
+        if device is not None:
+            _renameat2_rejected.add(device)
+
+def conflict_reason(error):
+    """Motivo legible de un FileExistsError generado por apply_renames"""
+    if error.strerror and error.strerror != os.strerror(errno.EEXIST):
+        return error.strerror
+    return CONFLICT_LABELS[CONFLICT_EXISTS]
+
+def _rename_in(parent, source, target, handles=None):
+    """
+    rename_noreplace de source a target (rutas dentro de parent), relativo al
+    descriptor de parent si hay uno disponible en handles.
+    """
+    fd = handles.acquire(parent) if handles is not None else None
+    if fd is None:
+        rename_noreplace(source, target)
+        return
+    try:
+        rename_noreplace(source.name, target.name, fd)
+    except OSError as e:
+        # Informar las rutas completas, no solo los nombres
+        e.filename, e.filename2 = str(source), str(target)
+        raise
+    finally:
+        handles.release(parent)
+
+def _rename_row(item, journal=None, metrics=None, source_name=None, target_name=None, handles=None):
+    """
+    Renombra la entrada de una fila del plan y lo registra en el diario.
+    source_name/target_name sustituyen al origen o al destino de la fila
+    (los dos pasos de un renombrado a través de un nombre temporal).
+    handles (DirectoryHandles) permite renombrar relativo al directorio padre.
+    """
+    source = item['folder']
+    parent = source.parent
+    if source_name is not None:
+        source = parent / source_name
+    target = parent / (target_name or item['new_name'])
+    if metrics is None:
+        _rename_in(parent, source, target, handles)
+    else:
+        started = time.perf_counter()
+        try:
+            _rename_in(parent, source, target, handles)
+        finally:
+            metrics.record(METRIC_RENAME, time.perf_counter() - started)
+    if handles is not None:
+        # Su ruta ya no existe: no conservar su descriptor (si se abrió para sus subcarpetas)
+        handles.discard(source)
+    if journal is not None:
+        journal.record(source, target)
+
+def _entry_key(item, name):
+    """Clave de una entrada del directorio de una fila, como la compara el sistema"""
+    return item['folder'].parent, os.path.normcase(name)
+
+def _apply_scheduled(item, deferred, failed, journal=None, metrics=None, handles=None):
+    """
+    Aplica una fila que depende de otras ('after' o 'via') y genera (fila, error).
+    - Si la carpeta que debía liberar el destino ('after') falló, no se renombra.
+    - Si rompe un ciclo ('via'), se aparta al nombre temporal y su resultado se
+      genera al terminar la fila que libera su destino.
+    deferred y failed son el estado compartido de apply_renames.
+    """
+    error = None
+    if item.get('after') is not None and _entry_key(item, item['after']) in failed:
+        target = item['folder'].parent / item['new_name']
+        error = FileExistsError(errno.EEXIST, "El destino sigue ocupado porque no se pudo renombrar "
+                                              f"'{item['after']}'", str(target))
+    else:
+        try:
+            _rename_row(item, journal, metrics, target_name=item.get('via'), handles=handles)
+        except Exception as e:
+            error = e
+        else:
+            if item.get('via'):
+                deferred[_entry_key(item, item['new_name'])] = item
+                return
+    
+    source_key = _entry_key(item, item['original_name'])
+    if error is not None:
+        failed.add(source_key)
+    yield item, error
+    
+    # Si esta fila liberaba el destino de una carpeta apartada, completar el ciclo
+    pending = deferred.pop(source_key, None)
+    if pending is not None:
+        yield pending, _finish_cycle(pending, error, journal, metrics, handles)
+
+def _finish_cycle(item, blocker_error, journal=None, metrics=None, handles=None):
+    """Segundo paso de un ciclo: del nombre temporal al destino. Devuelve el error o None"""
+    if blocker_error is not None:
+        return FileExistsError(errno.EEXIST, f"El destino sigue ocupado; la carpeta quedó con el nombre "
+                                             f"temporal '{item['via']}'", str(item['folder'].parent / item['new_name']))
+    try:
+        _rename_row(item, journal, metrics, source_name=item['via'], handles=handles)
+    except Exception as e:
+        return e
+    return None
+
+def _collect_results(futures, pending, failed, progress=None):
+    """Genera (fila, error) de los futures terminados y los retira de pendientes"""
+    for future in futures:
+        item = pending.pop(future)
+        error = future.exception()
+        if error is not None:
+            failed.add(_entry_key(item, item['original_name']))
+        if progress is not None:
+            progress.advance()
+        yield item, error
+
+def apply_renames(rows, workers=1, journal=None, progress=None, metrics=None):
+    """
+    Aplica un flujo de filas del plan (en el orden de iter_plan_rows) con
+    workers hilos y genera (fila, error) a medida que terminan; las filas que
+    no se renombran se devuelven en el acto con error None.
+    """
+    handles = DirectoryHandles() if DIR_FD_SUPPORTED else None
+    try:
+        yield from _apply_rows(rows, workers, journal, progress, metrics, handles)
+    finally:
+        if handles is not None:
+            handles.close()
+
+def _apply_rows(rows, workers, journal, progress, metrics, handles):
+    """Cuerpo de apply_renames, con los descriptores de directorio ya preparados"""
+    deferred = {}  # destino de cada carpeta apartada a un nombre temporal -> fila
+    failed = set()  # orígenes que no se pudieron renombrar (sus destinos siguen ocupados)
+    
+    def scheduled(item):
+        for result in _apply_scheduled(item, deferred, failed, journal, metrics, handles):
+            if progress is not None:
+                progress.advance()
+            yield result
+    
+    def stop():
+        return progress is not None and progress.cancelled and not deferred
+    
+    if workers <= 1:
+        for item in rows:
+            if item.get('status', STATUS_RENAME) != STATUS_RENAME:
+                yield item, None
+                if stop():
+                    break
+                continue
+            if item.get('after') is not None or item.get('via'):
+                yield from scheduled(item)
+            else:
+                try:
+                    _rename_row(item, journal, metrics, handles=handles)
+                except Exception as e:
+                    error = e
+                    failed.add(_entry_key(item, item['original_name']))
+                else:
+                    error = None
+                if progress is not None:
+                    progress.advance()
+                yield item, error
+            if stop():
+                break
+    else:
+        max_pending = workers * 4
+        pending = {}
+        last_depth = None
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for item in rows:
+                if item.get('status', STATUS_RENAME) != STATUS_RENAME:
+                    yield item, None
+                    # También se cancela entre filas que no se renombran
+                    if stop():
+                        break
+                    continue
+                
+                depth = item.get('depth', 0)
+                
+                # Al subir de nivel, esperar a que terminen las subcarpetas pendientes
+                if last_depth is not None and depth < last_depth:
+                    deeper = [future for future, other in pending.items()
+                              if other.get('depth', 0) > depth]
+                    if deeper:
+                        wait(deeper)
+                        yield from _collect_results(deeper, pending, failed, progress)
+                last_depth = depth
+                
+                if item.get('after') is not None or item.get('via'):
+                    # Cadena o ciclo: se aplica en orden, con los renombrados previos terminados
+                    if pending:
+                        wait(pending)
+                        yield from _collect_results(list(pending), pending, failed, progress)
+                    yield from scheduled(item)
+                else:
+                    # Limitar los renombrados en curso para no acumular el lote en memoria
+                    while len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from _collect_results(done, pending, failed, progress)
+                    
+                    pending[executor.submit(_rename_row, item, journal, metrics, handles=handles)] = item
+                
+                # Cancelación: no se toman más filas y se esperan las ya iniciadas
+                if stop():
+                    break
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _collect_results(done, pending, failed, progress)
+    
+    # Ciclos sin cerrar (el flujo terminó antes de liberar su destino)
+    for item in deferred.values():
+        if progress is not None:
+            progress.advance()
+        yield item, FileExistsError(errno.EEXIST, f"El destino sigue ocupado; la carpeta quedó con el "
+                                                  f"nombre temporal '{item['via']}'",
+                                    str(item['folder'].parent / item['new_name']))
+
+# Diario de renombrados: directorio por defecto (se puede cambiar con RENOMBRADOR_JOURNAL_DIR)
+JOURNAL_DIR = os.environ.get('RENOMBRADOR_JOURNAL_DIR') or os.path.join(
+    os.path.expanduser('~'), '.renombrador_universal', 'journals')
+
+# Operaciones que cierran un diario; sin ninguna de ellas el diario quedó incompleto.
+# 'undo_partial' cierra una reversión con errores: el diario sigue pudiéndose deshacer
+JOURNAL_CLOSING_OPS = ('end', 'undo', 'undo_partial', 'resumed', 'discarded')
+
+# Diarios cerrados que se conservan; los más antiguos se borran al crear uno nuevo
+JOURNAL_KEEP = 100
+
+# Bytes leídos del final de un diario para encontrar su último registro
+_JOURNAL_TAIL_BYTES = 512
+
+# Secuencia de los diarios creados por este proceso (ver _journal_order)
+_journal_sequence = itertools.count(1)
+
+class RenameJournal:
+    """
+    Diario de renombrados en modo solo-anexar: una línea JSON por operación.
+    El archivo se crea con el primer renombrado registrado, así las ejecuciones
+    sin cambios no dejan diarios vacíos. Las escrituras se vuelcan a disco
+    (flush + fsync) por lotes, cada flush_every renombrados o flush_interval
+    segundos, para no frenar el renombrado.
+    """
+    
+    def __init__(self, base_path, options=None, directory=None,
+                 flush_every=64, flush_interval=1.0):
+        self.base_path = str(base_path)
+        self.options = dict(options) if options else dict(DEFAULT_OPTIONS)
+        self.directory = directory or JOURNAL_DIR
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.path = None
+        self.count = 0
+        self._file = None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _open(self):
+        """Crea el archivo del diario y escribe la cabecera"""
+        os.makedirs(self.directory, exist_ok=True)
+        prune_journals(self.directory)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S.%f')
+        while True:
+            # La secuencia ordena los diarios del mismo proceso aunque coincida la hora
+            name = f"{stamp}-{os.getpid()}-{next(_journal_sequence)}.jsonl"
+            self.path = os.path.join(self.directory, name)
+            try:
+                self._file = open(self.path, 'x', encoding='utf-8')
+                break
+            except FileExistsError:
+                continue
+        self._write({
+            'op': 'begin',
+            'base': self.base_path,
+            'options': self.options,
+            'started': datetime.now().isoformat(timespec='seconds'),
+        })
+        self._sync()
+    
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+    
+    def record(self, source, target):
+        """Registra un renombrado ya realizado"""
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._write({'op': 'rename', 'src': str(source), 'dst': str(target)})
+            self.count += 1
+            self._unflushed += 1
+            if (self._unflushed >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._sync()
+    
+    def close(self, completed=True):
+        """
+        Cierra el diario. Si completed es False (interrupción) no se escribe la
+        marca de fin, de modo que el diario se detecta como incompleto.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            if completed:
+                self._write({'op': 'end', 'renamed': self.count,
+                             'finished': datetime.now().isoformat(timespec='seconds')})
+            self._sync()
+            self._file.close()
+            self._file = None
+
+def read_journal(path):
+    """
+    Lee un diario y devuelve un dict con 'path', 'header', 'renames' (lista de
+    pares (origen, destino) en orden, sin los ya restaurados por una reversión
+    anterior) y 'closed' (operación de cierre o None).
+    Las líneas truncadas por un corte se ignoran.
+    """
+    header = None
+    renames = []
+    restored = Counter()
+    closed = None
+    with open(path, encoding='utf-8') as journal_file:
+        for line in journal_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            op = record.get('op')
+            if op == 'begin':
+                header = record
+            elif op == 'rename':
+                renames.append((record['src'], record['dst']))
+            elif op == 'restore':
+                restored[(record['src'], record['dst'])] += 1
+            elif op in JOURNAL_CLOSING_OPS:
+                closed = op
+    if restored:
+        # La reversión va en orden inverso: se descuentan las últimas apariciones
+        pending = []
+        for pair in reversed(renames):
+            if restored[pair]:
+                restored[pair] -= 1
+            else:
+                pending.append(pair)
+        renames = pending[::-1]
+    return {'path': path, 'header': header or {}, 'renames': renames, 'closed': closed}
+
+def list_journals(directory=None):
+    """Devuelve las rutas de los diarios existentes, del más reciente al más antiguo"""
+    directory = directory or JOURNAL_DIR
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.jsonl')]
+    except FileNotFoundError:
+        return []
+    
+    return [os.path.join(directory, name) for name in sorted(names, key=_journal_order, reverse=True)]
+
+def _journal_order(name):
+    """
+    Clave de orden de un diario 'fecha-hora.microsegundos-pid-secuencia.jsonl'
+    (o 'fecha-hora-pid[-n]' de versiones anteriores): el pid no interviene.
+    """
+    parts = name[:-len('.jsonl')].split('-')
+    try:
+        seconds, _, micros = parts[1].partition('.')
+        sequence = int(parts[3]) if len(parts) > 3 else 0
+        return (int(parts[0]), int(seconds), int(micros or 0), sequence)
+    except (IndexError, ValueError):
+        return (0, 0, 0, 0)
+
+def journal_closing_op(path):
+    """
+    Devuelve la operación de cierre de un diario leyendo solo su último
+    registro, o None si quedó incompleto (o no se puede leer).
+    """
+    try:
+        with open(path, 'rb') as journal_file:
+            size = journal_file.seek(0, os.SEEK_END)
+            journal_file.seek(max(0, size - _JOURNAL_TAIL_BYTES))
+            tail = journal_file.read()
+    except OSError:
+        return None
+    if not tail.endswith(b'\n'):
+        return None
+    try:
+        op = json.loads(tail[:-1].rsplit(b'\n', 1)[-1]).get('op')
+    except (ValueError, AttributeError):
+        return None
+    return op if op in JOURNAL_CLOSING_OPS else None
+
+def find_incomplete_journals(directory=None):
+    """Devuelve los diarios de ejecuciones que no terminaron (corte o interrupción)"""
+    return [read_journal(path) for path in list_journals(directory)
+            if journal_closing_op(path) is None]
+
+def find_last_undoable_journal(directory=None):
+    """Devuelve el diario más reciente que todavía se puede deshacer, o None"""
+    for path in list_journals(directory):
+        if journal_closing_op(path) == 'undo':
+            continue
+        journal = read_journal(path)
+        if journal['renames'] and journal['closed'] != 'undo':
+            return journal
+    return None
+
+def prune_journals(directory=None, keep=JOURNAL_KEEP):
+    """
+    Borra los diarios cerrados más antiguos y deja los keep más recientes.
+    Los diarios incompletos no se borran nunca. Devuelve cuántos se borraron.
+    """
+    removed = 0
+    for path in list_journals(directory)[keep:]:
+        if journal_closing_op(path) is None:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+    return removed
+
+def mark_journal(path, op):
+    """Añade una operación de cierre ('undo', 'resumed', 'discarded'...) al diario"""
+    with open(path, 'a', encoding='utf-8') as journal_file:
+        journal_file.write(json.dumps({'op': op, 'at': datetime.now().isoformat(timespec='seconds')},
+                                      separators=(',', ':')) + '\n')
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+def undo_journal(journal):
+    """
+    Deshace los renombrados de un diario en orden inverso y genera
+    (destino, origen, error) por cada uno; error es None si tuvo éxito.
+    Cada restauración se anota en el diario; solo si no hubo errores se marca
+    como deshecho, y si no queda como 'undo_partial' para reintentar lo que falta.
+    """
+    failed = False
+    with open(journal['path'], 'a', encoding='utf-8') as journal_file:
+        try:
+            for source, target in reversed(journal['renames']):
+                try:
+                    rename_noreplace(target, source)
+                except OSError as e:
+                    failed = True
+                    yield target, source, e
+                    continue
+                journal_file.write(json.dumps({'op': 'restore', 'src': source, 'dst': target},
+                                              ensure_ascii=False, separators=(',', ':')) + '\n')
+                journal_file.flush()
+                yield target, source, None
+        finally:
+            os.fsync(journal_file.fileno())
+    mark_journal(journal['path'], 'undo_partial' if failed else 'undo')
+
+def new_run_counts():
+    """Contadores vacíos de execute_renames"""
+    counts = {'cancelled': False, 'journal': None}
+    for key in ('renamed', 'skipped', 'errors'):
+        counts[key] = 0
+        counts[FILE_COUNTER_PREFIX + key] = 0
+    return counts
+
+def _result_of(error):
+    """Clasifica el error de un renombrado de apply_renames"""
+    if error is None:
+        return RESULT_RENAMED
+    if isinstance(error, FileExistsError):
+        return RESULT_EXISTS
+    if isinstance(error, PermissionError):
+        return RESULT_DENIED
+    return RESULT_FAILED
+
+def _count_ahead(rows, progress):
+    """
+    Lee cada directorio completo antes de entregar sus filas y suma sus
+    renombrados al total de progress, para mostrar porcentaje y tiempo restante.
+    """
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if item['count'] is None or item['index'] >= item['count']:
+            progress.add_total(sum(1 for row in batch if row['status'] == STATUS_RENAME))
+            yield from batch
+            batch = []
+    if batch:
+        progress.add_total(sum(1 for row in batch if row['status'] == STATUS_RENAME))
+        yield from batch
+
+def execute_renames(rows, base_path, options=None, counts=None, progress=None, metrics=None, total=None):
+    """
+    Aplica un flujo de filas del plan anotando los renombrados en un diario y
+    genera (fila, resultado, error) en el orden en que se leen las filas
+    (RESULT_PENDING para las que se renombran) y al terminar cada renombrado.
+    counts (ver new_run_counts) acumula los contadores y recibe en 'journal'
+    la ruta del diario; si se interrumpe, el diario queda sin marca de fin.
+    Si no se conoce total, se va calculando directorio a directorio.
+    """
+    counts = new_run_counts() if counts is None else counts
+    if progress is not None and total is None:
+        rows = _count_ahead(rows, progress)
+    workers = max(1, int(options.get('workers', 1))) if options else 1
+    read = []
+    
+    def emit(item, result, error=None):
+        counter = RESULT_COUNTERS.get(result)
+        if counter is not None:
+            counts[counter] += 1
+            if item.get('kind') == KIND_FILE:
+                counts[FILE_COUNTER_PREFIX + counter] += 1
+        return item, result, error
+    
+    def read_rows():
+        """Anota el evento de cada fila al leerla; apply_renames devuelve en el acto las que no se renombran"""
+        for item in rows:
+            if item['status'] == STATUS_UNCHANGED:
+                read.append(emit(item, RESULT_UNCHANGED))
+            elif item['status'] == STATUS_CONFLICT:
+                read.append(emit(item, RESULT_CONFLICT))
+            else:
+                read.append((item, RESULT_PENDING, None))
+            yield item
+    
+    journal = RenameJournal(base_path, options)
+    if progress is not None:
+        progress.start_phase(PHASE_APPLY, total)
+    try:
+        for item, error in apply_renames(read_rows(), workers, journal, progress, metrics):
+            # read solo guarda las filas leídas desde el último resultado (como mucho las que hay en curso)
+            yield from read
+            read.clear()
+            if item['status'] == STATUS_RENAME:
+                yield emit(item, _result_of(error), error)
+        yield from read
+    except BaseException:
+        journal.close(completed=False)
+        counts['journal'] = journal.path
+        raise
+    journal.close()
+    counts['journal'] = journal.path
+    if progress is not None:
+        progress.finish()
+        counts['cancelled'] = progress.cancelled
+
+# Archivos de plan: versión del formato JSONL que escribe write_plan
+PLAN_FORMAT_VERSION = 1
+
+def write_plan(plan_path, rows, base_path, options=None):
+    """
+    Guarda un plan de renombrado en formato JSONL para revisarlo y aplicarlo después.
+    La primera línea es la cabecera ('op': 'plan', versión, base y opciones);
+    luego una línea por cada fila que se renombraría o está en conflicto, con
+    'dir' relativo a la base, 'name', 'new_name', 'depth', 'conflict' y 'kind'; al final,
+    una línea 'end' con los totales que permite detectar planes truncados.
+    Las filas se consumen en flujo, sin materializar el plan.
+    Devuelve un dict con 'changes' y 'conflicts' escritos.
+    """
+    base_path = Path(base_path)
+    counts = {'changes': 0, 'conflicts': 0}
+    
+    with open(plan_path, 'w', encoding='utf-8') as plan_file:
+        def write(record):
+            plan_file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        
+        write({
+            'op': 'plan',
+            'version': PLAN_FORMAT_VERSION,
+            'base': str(base_path),
+            'options': dict(options) if options else dict(DEFAULT_OPTIONS),
+            'created': datetime.now().isoformat(timespec='seconds'),
+        })
+        
+        for item in rows:
+            if item['status'] == STATUS_UNCHANGED:
+                continue
+            directory = os.path.relpath(item['folder'].parent, base_path)
+            write({
+                'dir': directory,
+                'name': item['original_name'],
+                'new_name': item['new_name'],
+                'depth': item['depth'],
+                'conflict': item['conflict'],
+                'kind': item.get('kind', KIND_FOLDER),
+            })
+            counts['conflicts' if item['conflict'] else 'changes'] += 1
+        
+        write({'op': 'end', **counts})
+    
+    return counts
+
+def read_plan_header(plan_path):
+    """
+    Lee la cabecera de un plan guardado.
+    Lanza ValueError si el archivo no es un plan o su versión no es compatible.
+    """
+    with open(plan_path, encoding='utf-8') as plan_file:
+        try:
+            header = json.loads(plan_file.readline())
+        except ValueError:
+            header = None
+    if not isinstance(header, dict) or header.get('op') != 'plan':
+        raise ValueError(f"'{plan_path}' no es un archivo de plan")
+    if header.get('version') != PLAN_FORMAT_VERSION:
+        raise ValueError(f"versión de plan no compatible: {header.get('version')}")
+    return header
+
+def iter_plan_file(plan_path, base_path=None, stats=None):
+    """
+    Lee un plan guardado en flujo y genera sus filas con el mismo formato que
+    iter_plan_rows ('index' es la posición dentro del plan y 'count' es None).
+    No se normaliza ningún nombre: se usan los destinos guardados. Las rutas se
+    resuelven contra base_path o, si no se indica, contra la base del plan.
+    Si el plan termina sin la línea 'end' se cuenta en stats['plan_truncated'].
+    """
+    header = read_plan_header(plan_path)
+    base_path = Path(base_path or header['base'])
+    index = 0
+    ended = False
+    
+    with open(plan_path, encoding='utf-8') as plan_file:
+        next(plan_file)
+        for line in plan_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Línea truncada por un corte al escribir el plan
+                break
+            if record.get('op') == 'end':
+                ended = True
+                break
+            
+            index += 1
+            conflict = record.get('conflict')
+            item = {
+                'folder': base_path / record['dir'] / record['name'],
+                'original_name': record['name'],
+                'new_name': record['new_name'],
+                'will_change': True,
+                'has_conflict': conflict is not None,
+                'conflict': conflict,
+                'status': STATUS_CONFLICT if conflict else STATUS_RENAME,
+                'depth': record.get('depth', 0),
+                'index': index,
+                'count': None,
+                'groups': {},
+                'after': None,
+                'via': None,
+                # Los planes anteriores a la opción 'include_files' solo tienen carpetas
+                'kind': record.get('kind', KIND_FOLDER),
+            }
+            _count_row(stats, item, 'total')
+            _count_row(stats, item, 'conflicts' if conflict else 'changes')
+            yield item
+    
+    if not ended:
+        _count(stats, 'plan_truncated')
+
+def _is_directory(source, dir_fd=None):
+    """Indica si source es una carpeta, siguiendo los enlaces simbólicos"""
+    try:
+        if dir_fd is None:
+            return stat.S_ISDIR(os.stat(source).st_mode)
+        return stat.S_ISDIR(os.stat(source.name, dir_fd=dir_fd).st_mode)
+    except OSError:
+        return False
+
+def validate_plan_row(item, vacated=None, check_target=True, dir_fd=None):
+    """
+    Comprobación barata de una fila de un plan guardado antes de renombrarla:
+    un lstat del origen y otro del destino, sin volver a listar el directorio.
+    vacated es un conjunto de nombres (normcase) que otras filas del mismo
+    directorio van a liberar: si el destino es uno de ellos no se comprueba.
+    Con check_target=False el destino no se comprueba: lo hace el propio
+    renombrado atómico (rename_noreplace), que informa EEXIST.
+    Con dir_fd (el directorio padre abierto) las consultas son relativas a él.
+    Devuelve None si la fila sigue siendo válida, o el motivo del conflicto.
+    """
+    source = item['folder']
+    try:
+        if dir_fd is None:
+            status = os.lstat(source)
+        else:
+            status = os.stat(source.name, dir_fd=dir_fd, follow_symlinks=False)
+        is_dir = stat.S_ISDIR(status.st_mode)
+        if stat.S_ISLNK(status.st_mode):
+            # El recorrido sigue los enlaces: un enlace a una carpeta se planificó como carpeta
+            is_dir = _is_directory(source, dir_fd)
+        if is_dir != (item.get('kind', KIND_FOLDER) == KIND_FOLDER):
+            # Ya no es el mismo tipo de entrada (una carpeta donde había un archivo o al revés)
+            return CONFLICT_MISSING
+    except OSError:
+        return CONFLICT_MISSING
+    
+    target_key = os.path.normcase(item['new_name'])
+    if target_key == os.path.normcase(item['original_name']):
+        # Solo cambia la capitalización: el "destino" es la propia carpeta
+        return None
+    if not check_target or (vacated is not None and target_key in vacated):
+        return None
+    if dir_fd is None:
+        exists = os.path.lexists(source.parent / item['new_name'])
+    else:
+        exists = _lexists_at(item['new_name'], dir_fd)
+    return CONFLICT_EXISTS if exists else None
+
+def _validate_plan_directory(rows, stats=None, check_targets=True):
+    """
+    Valida las filas de un mismo directorio de un plan guardado y las genera en
+    el orden resuelto por schedule_renames. Un destino ocupado por otra carpeta
+    del plan que también se renombra no es conflicto, salvo que esa carpeta
+    no se pueda renombrar.
+    """
+    metrics = _metrics(stats)
+    parent = rows[0]['folder'].parent
+    dir_fd = None
+    if DIR_FD_SUPPORTED:
+        try:
+            dir_fd = open_directory(parent)
+        except OSError:
+            pass  # Las comprobaciones por ruta informarán los orígenes que faltan
+    try:
+        rows = _check_plan_directory(rows, stats, check_targets, metrics, parent, dir_fd)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    yield from rows
+
+def _check_plan_directory(rows, stats, check_targets, metrics, parent, dir_fd):
+    """Comprobaciones y orden de _validate_plan_directory; devuelve las filas"""
+    movers = {item['original_name']: item for item in rows if item['status'] == STATUS_RENAME}
+    vacated = {os.path.normcase(name): name for name in movers}
+    
+    conflicts = {}
+    for name, item in movers.items():
+        if metrics is None:
+            conflicts[name] = validate_plan_row(item, vacated, check_targets, dir_fd)
+        else:
+            started = time.perf_counter()
+            conflicts[name] = validate_plan_row(item, vacated, check_targets, dir_fd)
+            metrics.add(METRIC_CHECKS, time.perf_counter() - started)
+    
+    # Los destinos que dependen de una carpeta que no se renombrará se comprueban en disco
+    waiting = {}
+    for name, item in movers.items():
+        blocker = vacated.get(os.path.normcase(item['new_name']))
+        if conflicts[name] is None and blocker is not None and blocker != name:
+            waiting[name] = blocker
+    blocked = True
+    while blocked:
+        blocked = False
+        for name, blocker in list(waiting.items()):
+            if conflicts[blocker] is not None:
+                del waiting[name]
+                conflicts[name] = validate_plan_row(movers[name], check_target=check_targets, dir_fd=dir_fd)
+                blocked = True
+    
+    for name, conflict in conflicts.items():
+        if conflict:
+            _count(stats, 'stale')
+            movers[name].update(conflict=conflict, has_conflict=True, status=STATUS_CONFLICT)
+    
+    if waiting:
+        moves = {name: item['new_name'] for name, item in movers.items() if not conflicts[name]}
+        taken = set(vacated).union(os.path.normcase(item['new_name']) for item in rows)
+        order, after, via = schedule_renames(
+            moves, lambda name: os.path.normcase(name) in taken or (
+                os.path.lexists(parent / name) if dir_fd is None else _lexists_at(name, dir_fd)))
+        scheduled = iter(order)
+        rows = [movers[next(scheduled)] if item['original_name'] in moves else item for item in rows]
+        for name in moves:
+            movers[name].update(after=after.get(name), via=via.get(name))
+    
+    return rows
+
+def validate_plan_rows(rows, stats=None, check_targets=True):
+    """
+    Valida en flujo las filas a renombrar de un plan guardado, un directorio
+    a la vez (sus filas son consecutivas en el plan). Las filas que ya no son
+    válidas se marcan como conflicto y se cuentan en stats['stale']; las que
+    dependen de otras del mismo directorio se reordenan (ver schedule_renames).
+    check_targets=False omite el lstat del destino cuando los renombrados son
+    atómicos (ver atomic_renames_available).
+    """
+    group = []
+    for item in rows:
+        if group and item['folder'].parent != group[0]['folder'].parent:
+            yield from _validate_plan_directory(group, stats, check_targets)
+            group = []
+        group.append(item)
+    if group:
+        yield from _validate_plan_directory(group, stats, check_targets)
@@ -9,14 +9,82 @@ Fecha: 2025-06-01
 """
 
 import os
-import re
 import sys
-import unicodedata
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 from pathlib import Path
+import queue
 import threading
+import time
 from datetime import datetime
+from functools import partial
+
+from rename_folders_core import (
+    CONFLICT_LABELS,
+    FILE_COUNTER_PREFIX,
+    KIND_FILE,
+    KIND_FOLDER,
+    PHASE_PLAN,
+    PHASE_SCAN,
+    ProgressTracker,
+    RESULT_CONFLICT,
+    RESULT_EXISTS,
+    RESULT_PENDING,
+    RESULT_RENAMED,
+    RESULT_UNCHANGED,
+    STAT_CALLS_NOTE,
+    STATUS_CONFLICT,
+    STATUS_RENAME,
+    STATUS_UNCHANGED,
+    SUFFIX_LABELS,
+    conflict_reason,
+    count_by_kind,
+    execute_renames,
+    find_incomplete_journals,
+    find_last_undoable_journal,
+    format_progress,
+    iter_listings,
+    iter_plan_rows,
+    mark_journal,
+    new_run_counts,
+    normalize_file_names,
+    normalize_many,
+    signature_changed,
+    undo_journal,
+)
+
+# Espera (ms) antes de recalcular la vista previa tras cambiar una opción,
+# para agrupar varios cambios seguidos en un solo recálculo
+PREVIEW_DEBOUNCE_MS = 250
+
+# Intervalo (ms) con que el hilo principal vacía la cola de mensajes de los
+# hilos de trabajo, y máximo de mensajes procesados por tanda
+UI_DRAIN_MS = 100
+UI_DRAIN_BATCH = 5000
+
+# Filas que el hilo de la vista previa agrupa antes de enviarlas a la tabla,
+# y tiempo máximo (s) que retiene una tanda incompleta
+PREVIEW_BATCH = 2000
+PREVIEW_BATCH_SECONDS = 0.2
+
+# Filtros de la tabla de vista previa: (valor, texto)
+PREVIEW_FILTERS = (
+    ('all', "Todas"),
+    (STATUS_RENAME, "🔄 Se renombrarán"),
+    (STATUS_CONFLICT, "⚠️ Conflictos"),
+    (STATUS_UNCHANGED, "✅ Sin cambios"),
+)
+
+# Columnas de la tabla de vista previa: (id, título, ancho)
+PREVIEW_COLUMNS = (
+    ('status', "Estado", 190),
+    ('original', "Nombre actual", 240),
+    ('new', "Nombre nuevo", 240),
+    ('location', "Ubicación", 160),
+)
+
+# Orden de los estados al ordenar por la columna Estado
+STATUS_ORDER = {STATUS_CONFLICT: 0, STATUS_RENAME: 1, STATUS_UNCHANGED: 2}
 
 class RenombradorGUI:
     def __init__(self, root):
@@ -33,15 +101,51 @@ class RenombradorGUI:
         self.remove_special_var = tk.BooleanVar(value=True)
         self.preserve_numbers_var = tk.BooleanVar(value=True)
         self.preserve_dots_var = tk.BooleanVar(value=False)
+        self.collision_suffix_var = tk.StringVar(value=SUFFIX_LABELS[None])
+        self.include_files_var = tk.BooleanVar(value=False)
+        self.recursive_var = tk.BooleanVar(value=False)
+        self.workers_var = tk.IntVar(value=1)
         
         # Lista para almacenar vista previa
         self.preview_data = []
         
+        # Tabla virtual de la vista previa: solo se insertan en el Treeview las
+        # filas visibles de preview_view (preview_data filtrada y ordenada)
+        self.preview_filter_var = tk.StringVar(value='all')
+        self.preview_summary_var = tk.StringVar(value="")
+        self.preview_view = []
+        self.preview_offset = 0
+        self.preview_visible_rows = 20
+        self.preview_sort = None
+        self.preview_base = None
+        
+        # Último listado leído del disco, para recalcular la vista previa al
+        # cambiar opciones sin volver a listar: {'key', 'listings', 'signature'}
+        self.listing_cache = None
+        self.preview_after_id = None
+        
+        # Vista previa en segundo plano: cada análisis tiene un número de
+        # generación y un evento de cancelación; los resultados de análisis
+        # anteriores o cancelados se descartan al llegar
+        self.preview_generation = 0
+        self.preview_cancel = None
+        
+        # Progreso del renombrado en curso (ProgressTracker), para poder cancelarlo
+        self.rename_progress = None
+        
         self.setup_ui()
         
         # Aplicar tema moderno
         self.apply_modern_theme()
         
+        # Cola de mensajes de los hilos de trabajo: los hilos nunca tocan los
+        # widgets, solo encolan líneas de log o acciones que ejecuta el hilo principal
+        self.ui_queue = queue.Queue()
+        self.root.after(UI_DRAIN_MS, self.drain_ui_queue)
+        
+        # Ofrecer completar o revertir ejecuciones interrumpidas
+        self.root.after(300, self.check_incomplete_journals)
+        
     def setup_ui(self):
         """Configura la interfaz de usuario"""
         
@@ -102,6 +206,26 @@ class RenombradorGUI:
         ttk.Checkbutton(right_options, text="Preservar puntos (.)", 
                        variable=self.preserve_dots_var, command=self.update_preview).pack(anchor=tk.W, pady=2)
         
+        ttk.Checkbutton(options_frame, text="🌳 Incluir subcarpetas (modo recursivo)", 
+                       variable=self.recursive_var, command=self.update_preview).grid(row=1, column=0, sticky=tk.W, pady=(6, 0))
+        
+        workers_frame = ttk.Frame(options_frame)
+        workers_frame.grid(row=1, column=1, sticky=tk.W, pady=(6, 0))
+        ttk.Label(workers_frame, text="🧵 Hilos de renombrado:").pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Spinbox(workers_frame, from_=1, to=32, width=4, 
+                   textvariable=self.workers_var).pack(side=tk.LEFT)
+        
+        ttk.Checkbutton(options_frame, text="📄 Incluir archivos (conserva la extensión)", 
+                       variable=self.include_files_var, command=self.update_preview).grid(row=2, column=0, sticky=tk.W, pady=(6, 0))
+        
+        suffix_frame = ttk.Frame(options_frame)
+        suffix_frame.grid(row=2, column=1, sticky=tk.W, pady=(6, 0))
+        ttk.Label(suffix_frame, text="🔢 Colisiones:").pack(side=tk.LEFT, padx=(0, 5))
+        suffix_combo = ttk.Combobox(suffix_frame, textvariable=self.collision_suffix_var, state='readonly',
+                                    values=list(SUFFIX_LABELS.values()), width=24)
+        suffix_combo.pack(side=tk.LEFT)
+        suffix_combo.bind('<<ComboboxSelected>>', lambda event: self.update_preview())
+        
         # Botones de acción
         buttons_frame = ttk.Frame(main_frame)
         buttons_frame.grid(row=3, column=0, columnspan=3, pady=(0, 15))
@@ -118,6 +242,13 @@ class RenombradorGUI:
                                    command=self.start_rename_process, style="Accent.TButton")
         self.rename_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.cancel_btn = ttk.Button(buttons_frame, text="⏹️ Cancelar", command=self.cancel_rename,
+                                     state='disabled')
+        self.cancel_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.undo_btn = ttk.Button(buttons_frame, text="↩️ Deshacer", command=self.undo_last_rename)
+        self.undo_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         self.help_btn = ttk.Button(buttons_frame, text="❓ Ayuda", command=self.show_help)
         self.help_btn.pack(side=tk.LEFT)
         
@@ -129,8 +260,37 @@ class RenombradorGUI:
         preview_frame = ttk.Frame(notebook)
         notebook.add(preview_frame, text="Vista Previa")
         
-        self.preview_text = scrolledtext.ScrolledText(preview_frame, height=15, wrap=tk.WORD)
-        self.preview_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        preview_frame.columnconfigure(0, weight=1)
+        preview_frame.rowconfigure(1, weight=1)
+        
+        filter_frame = ttk.Frame(preview_frame)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky=tk.W, padx=10, pady=(10, 5))
+        ttk.Label(filter_frame, text="Mostrar:").pack(side=tk.LEFT, padx=(0, 5))
+        for value, text in PREVIEW_FILTERS:
+            ttk.Radiobutton(filter_frame, text=text, value=value, variable=self.preview_filter_var,
+                           command=self.refresh_preview_view).pack(side=tk.LEFT, padx=(0, 8))
+        
+        self.preview_tree = ttk.Treeview(preview_frame, columns=[column for column, _, _ in PREVIEW_COLUMNS],
+                                         show='headings', selectmode='browse')
+        for column, title, width in PREVIEW_COLUMNS:
+            self.preview_tree.heading(column, text=title, command=lambda c=column: self.sort_preview(c))
+            self.preview_tree.column(column, width=width, stretch=True)
+        self.preview_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(10, 0))
+        
+        # La barra de desplazamiento no controla el Treeview sino el desplazamiento
+        # dentro de preview_view: el Treeview nunca tiene más filas que las visibles
+        self.preview_scroll = ttk.Scrollbar(preview_frame, orient=tk.VERTICAL, command=self.scroll_preview)
+        self.preview_scroll.grid(row=1, column=1, sticky=(tk.N, tk.S), padx=(0, 10))
+        
+        self.preview_tree.bind("<Configure>", self.on_preview_resize)
+        self.preview_tree.bind("<MouseWheel>", self.on_preview_wheel)
+        self.preview_tree.bind("<Button-4>", self.on_preview_wheel)
+        self.preview_tree.bind("<Button-5>", self.on_preview_wheel)
+        self.preview_tree.bind("<Prior>", lambda event: self.scroll_preview('scroll', -1, 'pages'))
+        self.preview_tree.bind("<Next>", lambda event: self.scroll_preview('scroll', 1, 'pages'))
+        
+        ttk.Label(preview_frame, textvariable=self.preview_summary_var, justify=tk.LEFT).grid(
+            row=2, column=0, columnspan=2, sticky=tk.W, padx=10, pady=(5, 10))
         
         # Pestaña de log de resultados
         log_frame = ttk.Frame(notebook)
@@ -139,10 +299,14 @@ class RenombradorGUI:
         self.log_text = scrolledtext.ScrolledText(log_frame, height=15, wrap=tk.WORD)
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # Barra de progreso (determinada cuando se conoce el total)
+        self.progress_bar = ttk.Progressbar(main_frame, mode='determinate', maximum=100)
+        self.progress_bar.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E))
+        
         # Barra de estado
         self.status_var = tk.StringVar(value="Listo - Selecciona un directorio para comenzar")
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN)
-        status_bar.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(5, 0))
+        status_bar.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(5, 0))
         
         # Inicializar con directorio actual
         self.use_current_directory()
@@ -188,157 +352,373 @@ class RenombradorGUI:
             'replace_spaces': self.replace_spaces_var.get(),
             'remove_special': self.remove_special_var.get(),
             'preserve_numbers': self.preserve_numbers_var.get(),
-            'preserve_dots': self.preserve_dots_var.get()
+            'preserve_dots': self.preserve_dots_var.get(),
+            'collision_suffix': self.get_collision_suffix(),
+            'include_files': self.include_files_var.get(),
+            'recursive': self.recursive_var.get(),
+            'workers': self.get_workers()
         }
         
-    def normalize_folder_name(self, name, options=None):
-        """Normaliza el nombre de la carpeta según las opciones especificadas"""
-        if not name or not isinstance(name, str):
-            return 'unnamed_folder'
-        
-        if options is None:
-            options = self.get_options()
-        
-        original_name = name
-        
-        # Convertir a minúsculas si está habilitado
-        if options.get('lowercase', True):
-            name = name.lower()
-        
-        # Eliminar acentos si está habilitado
-        if options.get('remove_accents', True):
-            try:
-                name = unicodedata.normalize('NFD', name)
-                name = ''.join(char for char in name if unicodedata.category(char) != 'Mn')
-            except:
-                pass
-        
-        # Construir patrón de caracteres permitidos
-        allowed_chars = r'a-zA-Z'
-        
-        if options.get('preserve_numbers', True):
-            allowed_chars += r'0-9'
-        
-        if options.get('preserve_dots', False):
-            allowed_chars += r'\.'
-        
-        # Reemplazar espacios
-        if options.get('replace_spaces', True):
-            name = re.sub(r'\s+', '_', name)
-            allowed_chars += r'_'
-        else:
-            allowed_chars += r'\s'
-        
-        # Eliminar caracteres especiales si está habilitado
-        if options.get('remove_special', True):
-            pattern = f'[^{allowed_chars}]'
-            name = re.sub(pattern, '_', name)
-        
-        # Limpiar múltiples guiones bajos consecutivos
-        name = re.sub(r'_+', '_', name)
-        
-        # Eliminar guiones bajos al inicio y final
-        name = name.strip('_')
-        
-        # Si el nombre queda vacío, usar un nombre por defecto
-        if not name:
-            name = 'unnamed_folder'
-        
-        return name
+    def set_options(self, options):
+        """Carga un diccionario de opciones en los controles"""
+        self.lowercase_var.set(options.get('lowercase', True))
+        self.remove_accents_var.set(options.get('remove_accents', True))
+        self.replace_spaces_var.set(options.get('replace_spaces', True))
+        self.remove_special_var.set(options.get('remove_special', True))
+        self.preserve_numbers_var.set(options.get('preserve_numbers', True))
+        self.preserve_dots_var.set(options.get('preserve_dots', False))
+        self.collision_suffix_var.set(SUFFIX_LABELS.get(options.get('collision_suffix'), SUFFIX_LABELS[None]))
+        self.include_files_var.set(options.get('include_files', False))
+        self.recursive_var.set(options.get('recursive', False))
+        self.workers_var.set(options.get('workers', 1))
+        
+    def get_collision_suffix(self):
+        """Obtiene la estrategia de sufijos elegida en el desplegable (None = omitir colisiones)"""
+        label = self.collision_suffix_var.get()
+        for strategy, strategy_label in SUFFIX_LABELS.items():
+            if strategy_label == label:
+                return strategy
+        return None
+        
+    def get_workers(self):
+        """Obtiene la cantidad de hilos de renombrado (1 si el valor no es válido)"""
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
         
     def update_preview(self):
-        """Actualiza la vista previa automáticamente"""
+        """
+        Actualiza la vista previa automáticamente. Los cambios seguidos de
+        opciones se agrupan: solo se recalcula tras PREVIEW_DEBOUNCE_MS sin cambios.
+        """
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(PREVIEW_DEBOUNCE_MS, self.run_scheduled_preview)
+        
+    def run_scheduled_preview(self):
+        """Ejecuta la vista previa programada por update_preview"""
+        self.preview_after_id = None
         if self.directory_var.get():
             self.show_preview()
             
+    def reload_preview(self):
+        """Descarta el listado en caché y vuelve a generar la vista previa desde el disco"""
+        self.listing_cache = None
+        self.update_preview()
+        
+    def iter_cached_listings(self, base_path, recursive, stats, cache, progress=None):
+        """
+        (Hilo de la vista previa) Genera los listados del directorio, reutilizando
+        los de la caché si el directorio y el modo coinciden y ningún directorio
+        cambió (un stat por directorio). Si lee el disco y llega al final, envía
+        los listados al hilo principal como nueva caché.
+        La fase del progreso indica si se lee el disco o solo se planifica.
+        """
+        key = (str(base_path), recursive)
+        if cache is not None and cache['key'] == key and not signature_changed(cache['signature'], stats):
+            if progress is not None:
+                progress.start_phase(PHASE_PLAN)
+            yield from cache['listings']
+            return
+        
+        if progress is not None:
+            progress.start_phase(PHASE_SCAN)
+        signature = {}
+        listings = []
+        for listing in iter_listings(base_path, stats, recursive, signature):
+            listings.append(listing)
+            yield listing
+        self.post(self.store_listing_cache, {'key': key, 'listings': listings, 'signature': signature})
+        
+    def store_listing_cache(self, cache):
+        """Guarda los listados leídos por el hilo de la vista previa"""
+        self.listing_cache = cache
+        
     def show_preview(self):
-        """Muestra una vista previa de los cambios que se realizarán"""
+        """
+        Inicia la vista previa de los cambios en un hilo separado. Las filas
+        llegan a la tabla por tandas mientras se analiza; un análisis en curso
+        se cancela al pedir otro (otro directorio u otras opciones).
+        """
         directory = self.directory_var.get()
         if not directory:
             messagebox.showwarning("Advertencia", "Por favor selecciona un directorio primero.")
             return
+        
+        self.cancel_preview()
+        self.preview_generation += 1
+        self.preview_cancel = threading.Event()
+        
+        options = self.get_options()
+        self.preview_data = []
+        self.preview_base = None
+        self.refresh_preview_view()
+        self.preview_summary_var.set("⏳ Analizando…")
+        self.update_status("🔍 Analizando directorio…")
+        self.preview_btn.configure(text="⏹️ Cancelar Análisis", command=self.cancel_preview_by_user)
+        
+        threading.Thread(target=self.preview_thread,
+                         args=(self.preview_generation, self.preview_cancel, directory, options, self.listing_cache),
+                         daemon=True).start()
+        
+    def cancel_preview(self):
+        """Cancela el análisis en curso, si lo hay (se detiene entre filas o directorios)"""
+        if self.preview_cancel is not None:
+            self.preview_cancel.set()
+            self.preview_cancel = None
             
+    def cancel_preview_by_user(self):
+        """Cancela el análisis en curso desde el botón de la vista previa"""
+        self.cancel_preview()
+        self.preview_generation += 1
+        self.reset_preview_button()
+        self.preview_summary_var.set(f"⏹️ Análisis cancelado ({len(self.preview_data)} carpetas analizadas).")
+        self.update_status("Vista previa cancelada")
+        
+    def reset_preview_button(self):
+        """Devuelve el botón de vista previa a su estado normal"""
+        self.preview_btn.configure(text="👁️ Vista Previa", command=self.show_preview)
+        
+    def preview_thread(self, generation, cancel, directory, options, cache):
+        """
+        Calcula la vista previa en un hilo separado y envía las filas por tandas.
+        No accede a los widgets: todo pasa por la cola de mensajes.
+        """
         try:
             base_path = Path(directory).resolve()
             
             if not base_path.exists():
-                self.update_status("ERROR: El directorio no existe")
+                self.post(self.fail_preview, generation, "ERROR: El directorio no existe")
                 return
                 
             if not base_path.is_dir():
-                self.update_status("ERROR: La ruta no es un directorio")
+                self.post(self.fail_preview, generation, "ERROR: La ruta no es un directorio")
                 return
             
-            folders = [item for item in base_path.iterdir() if item.is_dir()]
+            recursive = options['recursive']
+            stats = {}
+            progress = ProgressTracker(lambda snapshot: self.post(self.update_preview_progress, generation, snapshot))
+            listings = self.iter_cached_listings(base_path, recursive, stats, cache, progress)
             
-            if not folders:
-                self.preview_text.delete(1.0, tk.END)
-                self.preview_text.insert(tk.END, "ℹ️ No se encontraron carpetas en este directorio.")
-                self.update_status("No hay carpetas para procesar")
-                return
+            batch = []
+            last_post = time.monotonic()
+            for item in iter_plan_rows(base_path, options, stats, recursive, listings=listings):
+                if cancel.is_set():
+                    return
+                progress.advance()
+                batch.append(item)
+                if len(batch) >= PREVIEW_BATCH or time.monotonic() - last_post >= PREVIEW_BATCH_SECONDS:
+                    self.post(self.append_preview_rows, generation, base_path, batch)
+                    batch = []
+                    last_post = time.monotonic()
             
-            options = self.get_options()
-            self.preview_data = []
+            if cancel.is_set():
+                return
+            self.post(self.append_preview_rows, generation, base_path, batch)
+            self.post(self.finish_preview, generation, recursive, dict(stats))
             
-            # Generar vista previa
-            preview_content = f"📂 VISTA PREVIA - {len(folders)} carpetas encontradas\n"
-            preview_content += f"📍 Directorio: {base_path}\n"
-            preview_content += "═" * 80 + "\n\n"
+        except Exception as e:
+            self.post(self.fail_preview, generation, f"Error al generar vista previa: {str(e)}", str(e))
             
-            changes_count = 0
-            conflicts_count = 0
+    def append_preview_rows(self, generation, base_path, rows):
+        """Añade una tanda de filas del análisis en curso a la tabla"""
+        if generation != self.preview_generation:
+            return
+        
+        self.preview_base = base_path
+        self.preview_data.extend(rows)
+        selected = self.preview_filter_var.get()
+        self.preview_view.extend(item for item in rows if selected == 'all' or item['status'] == selected)
+        self.render_preview_window()
+        
+    def update_preview_progress(self, generation, snapshot):
+        """Muestra el progreso del análisis en curso en la barra de estado"""
+        if generation == self.preview_generation and self.preview_cancel is not None:
+            self.update_status(f"🔍 {format_progress(snapshot)}")
             
-            for i, folder in enumerate(folders, 1):
-                original_name = folder.name
-                new_name = self.normalize_folder_name(original_name, options)
-                
-                status = ""
-                if original_name == new_name:
-                    status = "✅ Sin cambios"
-                else:
-                    new_path = folder.parent / new_name
-                    if new_path.exists():
-                        status = "⚠️ CONFLICTO (ya existe)"
-                        conflicts_count += 1
-                    else:
-                        status = "🔄 Se renombrará"
-                        changes_count += 1
-                
-                preview_line = f"[{i:2d}] {status}\n"
-                preview_line += f"     '{original_name}'\n"
-                if original_name != new_name:
-                    preview_line += f"  → '{new_name}'\n"
-                preview_line += "\n"
-                
-                preview_content += preview_line
-                
-                self.preview_data.append({
-                    'folder': folder,
-                    'original_name': original_name,
-                    'new_name': new_name,
-                    'will_change': original_name != new_name,
-                    'has_conflict': new_path.exists() if original_name != new_name else False
-                })
-            
-            # Resumen
-            summary = f"\n{'='*80}\n"
-            summary += f"📊 RESUMEN:\n"
-            summary += f"   • Total de carpetas: {len(folders)}\n"
-            summary += f"   • Se renombrarán: {changes_count}\n"
-            summary += f"   • Sin cambios: {len(folders) - changes_count - conflicts_count}\n"
-            if conflicts_count > 0:
-                summary += f"   • ⚠️ Conflictos: {conflicts_count}\n"
+    def update_progress(self, snapshot):
+        """Muestra el progreso del renombrado: barra determinada y ritmo/tiempo restante"""
+        self.progress_bar['value'] = (snapshot['fraction'] or 0) * 100
+        self.update_status(format_progress(snapshot))
+        
+    def cancel_rename(self):
+        """Solicita detener el renombrado en curso entre carpetas"""
+        if self.rename_progress is not None:
+            self.rename_progress.cancel()
+            self.cancel_btn.configure(state='disabled')
+            self.update_status("⏹️ Cancelando: se terminan los renombrados en curso...")
+        
+    def fail_preview(self, generation, status, error=None):
+        """Informa un error del análisis en curso"""
+        if generation != self.preview_generation:
+            return
+        
+        self.preview_cancel = None
+        self.reset_preview_button()
+        self.preview_summary_var.set("")
+        self.update_status(status)
+        if error is not None:
+            messagebox.showerror("Error", f"Error al generar vista previa:\n{error}")
             
-            preview_content += summary
+    def finish_preview(self, generation, recursive, stats):
+        """Completa la vista previa: aplica el orden elegido y muestra el resumen"""
+        if generation != self.preview_generation:
+            return
+        
+        self.preview_cancel = None
+        self.reset_preview_button()
+        self.refresh_preview_view(keep_offset=True)
+        
+        if not self.preview_data:
+            self.preview_summary_var.set("ℹ️ No se encontraron carpetas en este directorio.")
+            self.update_status("No hay carpetas para procesar")
+            return
+        
+        total_count = stats.get('total', 0)
+        changes_count = stats.get('changes', 0)
+        conflicts_count = stats.get('conflicts', 0)
+        
+        # Resumen; con archivos, desglosado por tipo de entrada
+        by_kind = count_by_kind(stats)
+        if by_kind[KIND_FILE]['total']:
+            summary = f"📊 {total_count} entradas: {changes_count} se renombrarán, "
+        else:
+            summary = f"📊 {total_count} carpetas: {changes_count} se renombrarán, "
+        summary += f"{stats.get('unchanged', 0)} sin cambios"
+        if conflicts_count > 0:
+            summary += f", ⚠️ {conflicts_count} conflictos en {stats.get('conflict_groups', 0)} grupos"
+        if stats.get('suffixed'):
+            summary += f", 🔢 {stats['suffixed']} colisiones resueltas con sufijo"
+        if recursive:
+            summary += " · 🌳 modo recursivo"
+        if by_kind[KIND_FILE]['total']:
+            for kind, label in ((KIND_FOLDER, "📁 Carpetas"), (KIND_FILE, "📄 Archivos")):
+                counts = by_kind[kind]
+                summary += (f"\n{label}: {counts['changes']} se renombrarán, {counts['unchanged']} sin cambios, "
+                            f"{counts['conflicts']} conflictos")
+        summary += f"\n⚡ Ya normalizadas (vía rápida): {stats.get('fast_path', 0)}"
+        summary += f" · 🔎 Llamadas stat emitidas: {stats.get('stat_calls', 0)} {STAT_CALLS_NOTE}"
+        if stats.get('scan_errors'):
+            summary += f" · 🚫 Subcarpetas sin acceso (omitidas): {stats['scan_errors']}"
+        self.preview_summary_var.set(summary)
+        
+        self.update_status(f"Vista previa generada: {changes_count} cambios, {conflicts_count} conflictos")
+        
+    def refresh_preview_view(self, keep_offset=False):
+        """
+        Aplica el filtro y el orden elegidos a preview_data y vuelve al principio
+        de la tabla (o conserva la posición con keep_offset).
+        """
+        selected = self.preview_filter_var.get()
+        if selected == 'all':
+            view = list(self.preview_data)
+        else:
+            view = [item for item in self.preview_data if item['status'] == selected]
+        
+        if self.preview_sort is not None:
+            column, reverse = self.preview_sort
+            view.sort(key=self.preview_sort_key(column), reverse=reverse)
+        
+        self.preview_view = view
+        if keep_offset:
+            self.preview_offset = max(0, min(self.preview_offset, len(view) - self.preview_visible_rows))
+        else:
+            self.preview_offset = 0
+        self.render_preview_window()
+        
+    def preview_sort_key(self, column):
+        """Devuelve la función de orden de una columna de la tabla"""
+        if column == 'status':
+            return lambda item: STATUS_ORDER[item['status']]
+        if column == 'original':
+            return lambda item: item['original_name'].lower()
+        if column == 'new':
+            return lambda item: item['new_name'].lower()
+        return lambda item: str(item['folder'].parent).lower()
+        
+    def sort_preview(self, column):
+        """Ordena la tabla por una columna; un segundo clic invierte el orden y un tercero lo quita"""
+        if self.preview_sort == (column, False):
+            self.preview_sort = (column, True)
+        elif self.preview_sort == (column, True):
+            self.preview_sort = None
+        else:
+            self.preview_sort = (column, False)
+        
+        for other, title, _ in PREVIEW_COLUMNS:
+            arrow = ""
+            if self.preview_sort and self.preview_sort[0] == other:
+                arrow = " ▼" if self.preview_sort[1] else " ▲"
+            self.preview_tree.heading(other, text=title + arrow)
+        
+        self.refresh_preview_view()
+        
+    def render_preview_window(self):
+        """Dibuja en el Treeview solo las filas visibles de preview_view"""
+        tree = self.preview_tree
+        tree.delete(*tree.get_children())
+        
+        total = len(self.preview_view)
+        first = self.preview_offset
+        last = min(total, first + self.preview_visible_rows)
+        
+        for item in self.preview_view[first:last]:
+            if item['status'] == STATUS_CONFLICT:
+                status = f"⚠️ {CONFLICT_LABELS[item['conflict']]}"
+            elif item.get('via'):
+                status = f"🔁 Vía temporal '{item['via']}'"
+            elif item.get('after'):
+                status = f"🔄 Tras renombrar '{item['after']}'"
+            elif item['status'] == STATUS_RENAME:
+                status = "🔄 Se renombrará"
+            else:
+                status = "✅ Sin cambios"
             
-            self.preview_text.delete(1.0, tk.END)
-            self.preview_text.insert(tk.END, preview_content)
+            location = os.path.relpath(item['folder'].parent, self.preview_base) if self.preview_base else "."
+            if location == ".":
+                location = ""
+            new_name = item['new_name'] if item['will_change'] else ""
+            original_name = item['original_name']
+            if item.get('kind') == KIND_FILE:
+                original_name = f"📄 {original_name}"
+            tree.insert('', tk.END, values=(status, original_name, new_name, location))
+        
+        if total:
+            self.preview_scroll.set(first / total, last / total)
+        else:
+            self.preview_scroll.set(0.0, 1.0)
             
-            self.update_status(f"Vista previa generada: {changes_count} cambios, {conflicts_count} conflictos")
+    def scroll_preview(self, action, amount, unit=None):
+        """Desplaza la ventana visible de la tabla (comando de la barra de desplazamiento)"""
+        total = len(self.preview_view)
+        if action == 'moveto':
+            offset = int(float(amount) * total)
+        elif unit == 'pages':
+            offset = self.preview_offset + int(amount) * self.preview_visible_rows
+        else:
+            offset = self.preview_offset + int(amount)
+        
+        offset = max(0, min(offset, total - self.preview_visible_rows))
+        if offset != self.preview_offset:
+            self.preview_offset = offset
+            self.render_preview_window()
             
-        except Exception as e:
-            self.update_status(f"Error al generar vista previa: {str(e)}")
-            messagebox.showerror("Error", f"Error al generar vista previa:\n{str(e)}")
+    def on_preview_wheel(self, event):
+        """Desplaza la tabla con la rueda del ratón (Windows, macOS y X11)"""
+        if event.num == 4 or event.delta > 0:
+            self.scroll_preview('scroll', -3, 'units')
+        else:
+            self.scroll_preview('scroll', 3, 'units')
+        return "break"
+        
+    def on_preview_resize(self, event):
+        """Recalcula cuántas filas caben en la tabla al cambiar su tamaño"""
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, (event.height - 25) // row_height)
+        if visible != self.preview_visible_rows:
+            self.preview_visible_rows = visible
+            self.render_preview_window()
             
     def show_examples(self):
         """Muestra ejemplos de transformación en una ventana nueva"""
@@ -375,8 +755,13 @@ class RenombradorGUI:
         
         content = "Con la configuración actual:\n\n"
         
-        for i, example in enumerate(examples, 1):
-            transformed = self.normalize_folder_name(example, options)
+        transformations = list(zip(examples, normalize_many(examples, options)))
+        if options['include_files']:
+            # Los archivos conservan su extensión aunque no se preserven los puntos
+            file_examples = ["Foto Playa Ñandú.JPG", "Informe Final v1.2.PDF", "Canción (Directo).mp3"]
+            transformations += zip(file_examples, normalize_file_names(file_examples, options))
+        
+        for i, (example, transformed) in enumerate(transformations, 1):
             content += f"{i:2d}. '{example}'\n"
             content += f"    → '{transformed}'\n\n"
         
@@ -388,6 +773,10 @@ class RenombradorGUI:
         
     def start_rename_process(self):
         """Inicia el proceso de renombrado en un hilo separado"""
+        if self.preview_cancel is not None:
+            messagebox.showwarning("Advertencia", "Espera a que termine la vista previa en curso.")
+            return
+        
         if not self.preview_data:
             messagebox.showwarning("Advertencia", "Por favor genera una vista previa primero.")
             return
@@ -405,9 +794,13 @@ class RenombradorGUI:
             return
         
         # Confirmar la operación
-        message = f"¿Confirmas que quieres renombrar {len(changes)} carpetas?"
+        files = sum(1 for item in changes if item.get('kind') == KIND_FILE)
+        if files:
+            message = f"¿Confirmas que quieres renombrar {len(changes) - files} carpetas y {files} archivos?"
+        else:
+            message = f"¿Confirmas que quieres renombrar {len(changes)} carpetas?"
         if conflicts:
-            message += f"\n\nNOTA: {len(conflicts)} carpetas con conflictos serán omitidas."
+            message += f"\n\nNOTA: {len(conflicts)} entradas con conflictos serán omitidas."
         
         if not messagebox.askyesno("Confirmar Renombrado", message):
             return
@@ -417,76 +810,248 @@ class RenombradorGUI:
         self.preview_btn.configure(state='disabled')
         
         # Ejecutar en hilo separado para no bloquear la interfaz
-        threading.Thread(target=self.rename_folders_thread, daemon=True).start()
-        
-    def rename_folders_thread(self):
-        """Ejecuta el renombrado en un hilo separado"""
+        options = self.get_options()
+        directory = self.directory_var.get()
+        self.progress_bar['value'] = 0
+        self.rename_progress = ProgressTracker(lambda snapshot: self.post(self.update_progress, snapshot))
+        self.cancel_btn.configure(state='normal')
+        threading.Thread(target=self.rename_folders_thread,
+                         args=(options, directory, self.preview_data, self.rename_progress, len(changes)),
+                         daemon=True).start()
+        
+    def rename_folders_thread(self, options, directory, rows, progress, total):
+        """
+        Ejecuta el renombrado en un hilo separado.
+        No accede a los widgets: todo pasa por la cola de mensajes (post_log / post).
+        progress (ProgressTracker) informa el avance sobre total renombrados y
+        permite cancelar entre carpetas.
+        """
+        workers = options['workers']
         try:
-            self.log_text.delete(1.0, tk.END)
+            self.post(self.clear_log)
             
             log_content = f"🔄 INICIANDO PROCESO DE RENOMBRADO\n"
             log_content += f"📅 Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-            log_content += f"📂 Directorio: {self.directory_var.get()}\n"
+            log_content += f"📂 Directorio: {directory}\n"
+            if workers > 1:
+                log_content += f"🧵 Hilos de renombrado: {workers}\n"
             log_content += "═" * 80 + "\n\n"
             
-            self.root.after(0, lambda: self.log_text.insert(tk.END, log_content))
-            self.root.after(0, lambda: self.update_status("Renombrando carpetas..."))
+            self.post_log(log_content)
+            self.post(self.update_status, "Renombrando carpetas...")
             
-            renamed_count = 0
-            skipped_count = 0
-            error_count = 0
+            counts = new_run_counts()
+            positions = {}
+            row_number = 0
+            log = self.post_log
             
-            for i, item in enumerate(self.preview_data, 1):
-                if not item['will_change']:
-                    log_line = f"[{i:2d}] ✅ Sin cambios: '{item['original_name']}'\n"
-                    skipped_count += 1
-                elif item['has_conflict']:
-                    log_line = f"[{i:2d}] ⚠️ CONFLICTO: '{item['original_name']}' → '{item['new_name']}' (ya existe)\n"
-                    error_count += 1
+            for item, result, error in execute_renames(rows, Path(directory).resolve(), options, counts,
+                                                       progress, total=total):
+                if result in (RESULT_PENDING, RESULT_UNCHANGED, RESULT_CONFLICT):
+                    # Filas en el orden de la vista previa
+                    row_number += 1
+                    i = row_number
+                    if result == RESULT_PENDING:
+                        positions[id(item)] = i
+                        continue
                 else:
-                    try:
-                        new_path = item['folder'].parent / item['new_name']
-                        item['folder'].rename(new_path)
-                        log_line = f"[{i:2d}] 🔄 RENOMBRADO: '{item['original_name']}' → '{item['new_name']}'\n"
-                        renamed_count += 1
-                    except Exception as e:
-                        log_line = f"[{i:2d}] ❌ ERROR: '{item['original_name']}' - {str(e)}\n"
-                        error_count += 1
+                    i = positions.pop(id(item))
+                mark = "📄 " if item.get('kind') == KIND_FILE else ""
                 
-                self.root.after(0, lambda line=log_line: self.log_text.insert(tk.END, line))
-                self.root.after(0, lambda: self.log_text.see(tk.END))
+                if result == RESULT_UNCHANGED:
+                    log(f"[{i:2d}] ✅ Sin cambios: {mark}'{item['original_name']}'\n")
+                elif result == RESULT_CONFLICT:
+                    log(f"[{i:2d}] ⚠️ CONFLICTO: {mark}'{item['original_name']}' → '{item['new_name']}' ({CONFLICT_LABELS[item['conflict']]})\n")
+                elif result == RESULT_RENAMED:
+                    log(f"[{i:2d}] 🔄 RENOMBRADO: {mark}'{item['original_name']}' → '{item['new_name']}'\n")
+                elif result == RESULT_EXISTS:
+                    # El destino apareció después de la vista previa: no se reemplaza
+                    log(f"[{i:2d}] ⚠️ CONFLICTO: {mark}'{item['original_name']}' → '{item['new_name']}' ({conflict_reason(error)})\n")
+                else:
+                    log(f"[{i:2d}] ❌ ERROR: {mark}'{item['original_name']}' - {str(error)}\n")
+            
+            renamed_count = counts['renamed']
+            skipped_count = counts['skipped']
+            error_count = counts['errors']
+            cancelled = counts['cancelled']
+            files_renamed = counts[FILE_COUNTER_PREFIX + 'renamed']
             
             # Resumen final
             summary = f"\n{'='*80}\n"
-            summary += f"✅ PROCESO COMPLETADO\n\n"
+            if cancelled:
+                summary += f"⏹️ PROCESO CANCELADO: las carpetas restantes no se modificaron\n\n"
+            else:
+                summary += f"✅ PROCESO COMPLETADO\n\n"
             summary += f"📊 ESTADÍSTICAS FINALES:\n"
-            summary += f"   • Carpetas renombradas: {renamed_count}\n"
+            summary += f"   • Carpetas renombradas: {renamed_count - files_renamed}\n"
+            if options.get('include_files'):
+                summary += f"   • Archivos renombrados: {files_renamed}\n"
             summary += f"   • Sin cambios: {skipped_count}\n"
             summary += f"   • Errores/Conflictos: {error_count}\n"
-            summary += f"   • Total procesadas: {len(self.preview_data)}\n"
+            summary += f"   • Total procesadas: {len(rows)}\n"
+            if counts['journal']:
+                summary += f"   • Diario para deshacer: {counts['journal']}\n"
             
-            self.root.after(0, lambda: self.log_text.insert(tk.END, summary))
-            self.root.after(0, lambda: self.update_status(f"Completado: {renamed_count} renombradas, {error_count} errores"))
+            self.post_log(summary)
+            if cancelled:
+                self.post(self.update_status, f"Cancelado: {renamed_count} renombradas antes de detenerse")
+            else:
+                self.post(self.update_status, f"Completado: {renamed_count} renombradas, {error_count} errores")
             
             # Mostrar mensaje de éxito
-            if renamed_count > 0:
-                self.root.after(0, lambda: messagebox.showinfo("Proceso Completado", 
+            if renamed_count > 0 and not cancelled:
+                self.post(messagebox.showinfo, "Proceso Completado",
                     f"✅ Proceso completado exitosamente!\n\n"
                     f"Carpetas renombradas: {renamed_count}\n"
-                    f"Errores/Conflictos: {error_count}"))
+                    f"Errores/Conflictos: {error_count}")
             
-            # Actualizar vista previa
-            self.root.after(0, self.update_preview)
+            # Actualizar vista previa releyendo el disco
+            self.post(self.reload_preview)
             
         except Exception as e:
-            error_msg = f"❌ ERROR CRÍTICO: {str(e)}\n"
-            self.root.after(0, lambda: self.log_text.insert(tk.END, error_msg))
-            self.root.after(0, lambda: messagebox.showerror("Error Crítico", f"Error durante el renombrado:\n{str(e)}"))
+            self.post_log(f"❌ ERROR CRÍTICO: {str(e)}\n")
+            self.post(messagebox.showerror, "Error Crítico", f"Error durante el renombrado:\n{str(e)}")
             
         finally:
             # Rehabilitar botones
-            self.root.after(0, lambda: self.rename_btn.configure(state='normal'))
-            self.root.after(0, lambda: self.preview_btn.configure(state='normal'))
+            self.post(self.finish_rename)
+            self.post(self.rename_btn.configure, state='normal')
+            self.post(self.preview_btn.configure, state='normal')
+            
+    def finish_rename(self):
+        """Deja de seguir el renombrado terminado (o cancelado)"""
+        self.rename_progress = None
+        self.cancel_btn.configure(state='disabled')
+        
+    def post_log(self, text):
+        """Encola texto para el log (se puede llamar desde cualquier hilo)"""
+        self.ui_queue.put(('log', text))
+        
+    def post(self, callback, *args, **kwargs):
+        """Encola una acción sobre la interfaz para el hilo principal (desde cualquier hilo)"""
+        self.ui_queue.put(('call', partial(callback, *args, **kwargs)))
+        
+    def drain_ui_queue(self):
+        """
+        Vacía la cola de mensajes por tandas en el hilo principal: las líneas
+        de log consecutivas se insertan de una vez y se desplaza el log una
+        sola vez por tanda. Las acciones se ejecutan en el orden en que llegaron.
+        """
+        pending_lines = []
+        
+        def flush():
+            if pending_lines:
+                self.log_text.insert(tk.END, "".join(pending_lines))
+                pending_lines.clear()
+                return True
+            return False
+        
+        scrolled = False
+        try:
+            for _ in range(UI_DRAIN_BATCH):
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == 'log':
+                    pending_lines.append(payload)
+                else:
+                    scrolled = flush() or scrolled
+                    payload()
+        except queue.Empty:
+            pass
+        finally:
+            if flush() or scrolled:
+                self.log_text.see(tk.END)
+            self.root.after(UI_DRAIN_MS, self.drain_ui_queue)
+            
+    def clear_log(self):
+        """Borra el log de resultados"""
+        self.log_text.delete(1.0, tk.END)
+        
+    def undo_last_rename(self):
+        """Deshace el último renombrado registrado en el diario"""
+        journal = find_last_undoable_journal()
+        if journal is None:
+            messagebox.showinfo("Deshacer", "No hay renombrados registrados para deshacer.")
+            return
+        
+        header = journal['header']
+        message = (f"¿Deshacer {len(journal['renames'])} renombrados?\n\n"
+                   f"Directorio: {header.get('base', '?')}\n"
+                   f"Fecha: {header.get('started', '?')}")
+        if not messagebox.askyesno("Deshacer Renombrado", message):
+            return
+        
+        self.start_undo(journal)
+        
+    def start_undo(self, journal):
+        """Inicia la reversión de un diario en un hilo separado"""
+        self.rename_btn.configure(state='disabled')
+        self.preview_btn.configure(state='disabled')
+        self.undo_btn.configure(state='disabled')
+        threading.Thread(target=self.undo_thread, args=(journal,), daemon=True).start()
+        
+    def undo_thread(self, journal):
+        """Deshace los renombrados de un diario en un hilo separado"""
+        try:
+            self.post(self.clear_log)
+            self.post(self.update_status, "Deshaciendo renombrados...")
+            
+            restored_count = 0
+            error_count = 0
+            
+            for target, source, error in undo_journal(journal):
+                if error is None:
+                    log_line = f"↩️ RESTAURADO: '{target}' → '{source}'\n"
+                    restored_count += 1
+                else:
+                    log_line = f"❌ ERROR restaurando '{target}': {str(error)}\n"
+                    error_count += 1
+                self.post_log(log_line)
+            
+            summary = f"\n{'='*80}\n"
+            summary += f"↩️ REVERSIÓN COMPLETADA\n\n"
+            summary += f"   • Carpetas restauradas: {restored_count}\n"
+            summary += f"   • Errores: {error_count}\n"
+            if error_count:
+                summary += "\n💡 El diario sigue pendiente: pulsa 'Deshacer' para reintentar las entradas que faltan.\n"
+            
+            self.post_log(summary)
+            self.post(self.update_status, f"Deshecho: {restored_count} restauradas, {error_count} errores")
+            self.post(self.reload_preview)
+            
+        except Exception as e:
+            self.post(messagebox.showerror, "Error Crítico", f"Error al deshacer:\n{str(e)}")
+            
+        finally:
+            self.post(self.rename_btn.configure, state='normal')
+            self.post(self.preview_btn.configure, state='normal')
+            self.post(self.undo_btn.configure, state='normal')
+            
+    def check_incomplete_journals(self):
+        """Detecta renombrados interrumpidos y ofrece completarlos o revertirlos"""
+        for journal in find_incomplete_journals():
+            header = journal['header']
+            answer = messagebox.askyesnocancel(
+                "Renombrado Incompleto",
+                f"Una ejecución anterior se interrumpió antes de terminar.\n\n"
+                f"Directorio: {header.get('base', '?')}\n"
+                f"Fecha: {header.get('started', '?')}\n"
+                f"Renombrados realizados: {len(journal['renames'])}\n\n"
+                f"Sí: completar (cargar directorio y opciones para revisar y renombrar)\n"
+                f"No: revertir los renombrados ya realizados\n"
+                f"Cancelar: decidir más tarde")
+            
+            if answer is None:
+                continue
+            
+            if answer:
+                mark_journal(journal['path'], 'resumed')
+                self.set_options(header.get('options') or {})
+                self.directory_var.set(header.get('base', ''))
+                self.update_preview()
+                self.update_status("Revisa la vista previa y pulsa 'Renombrar Carpetas' para completar")
+            else:
+                self.start_undo(journal)
+            return
             
     def show_help(self):
         """Muestra la ventana de ayuda"""
@@ -535,8 +1100,20 @@ Este programa normaliza nombres de carpetas para hacerlos más compatibles con d
 • Preservar puntos: Mantiene los puntos en los nombres
   Ejemplo: "version 2.1" → "version_2.1"
 
+• Incluir subcarpetas (modo recursivo): Procesa todo el árbol de carpetas,
+  renombrando primero las más profundas para que las rutas sigan siendo válidas
+
+• Incluir archivos: Normaliza también los nombres de archivo en la misma pasada.
+  La extensión se normaliza aparte y conserva su punto aunque no se preserven
+  los puntos. Ejemplo: "Foto Playa.JPG" → "foto_playa.jpg"
+
+• Hilos de renombrado: Cantidad de renombrados simultáneos. Útil en unidades
+  de red (SMB/NFS), donde cada renombrado espera la respuesta del servidor
+
 🛡️ SEGURIDAD:
-• Solo renombra CARPETAS, NO toca archivos
+• Cada renombrado queda registrado en un diario: "Deshacer" revierte el último proceso
+• Si un proceso se interrumpe, al iniciar se ofrece completarlo o revertirlo
+• Solo renombra CARPETAS, salvo que actives "Incluir archivos"
 • No borra ni modifica el contenido de las carpetas
 • Detecta conflictos de nombres antes de hacer cambios
 • Muestra vista previa antes de hacer cualquier modificación
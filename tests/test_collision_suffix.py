@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas de los sufijos de colisión: volver a ejecutar no debe cambiar nada
+Uso: python -m unittest discover -s tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rename_folders_core import (
+    DEFAULT_OPTIONS,
+    STATUS_RENAME,
+    SUFFIX_HASH,
+    SUFFIX_NUMBER,
+    apply_renames,
+    iter_plan_rows,
+)
+
+class CollisionSuffixIdempotenceTest(unittest.TestCase):
+    """Una segunda ejecución sobre el resultado no planifica renombrados"""
+    
+    def setUp(self):
+        self.base = tempfile.mkdtemp(prefix='renombrador_test_')
+        for name in ('Foto!', 'Foto?', 'FOTO 2', 'Foto #'):
+            os.mkdir(os.path.join(self.base, name))
+        for name in ('Nota!.txt', 'Nota?.txt'):
+            open(os.path.join(self.base, name), 'w').close()
+    
+    def tearDown(self):
+        shutil.rmtree(self.base)
+    
+    def renames(self, options):
+        return [item for item in iter_plan_rows(self.base, options) if item['status'] == STATUS_RENAME]
+    
+    def check_second_run(self, strategy, preserve_numbers):
+        options = dict(DEFAULT_OPTIONS, collision_suffix=strategy, include_files=True,
+                       preserve_numbers=preserve_numbers)
+        for _, error in apply_renames(self.renames(options)):
+            self.assertIsNone(error)
+        self.assertEqual(self.renames(options), [])
+        return sorted(os.listdir(self.base))
+    
+    def test_number_suffix(self):
+        self.check_second_run(SUFFIX_NUMBER, True)
+    
+    def test_hash_suffix(self):
+        self.check_second_run(SUFFIX_HASH, True)
+    
+    def test_number_suffix_without_numbers(self):
+        names = self.check_second_run(SUFFIX_NUMBER, False)
+        self.assertFalse(any(char.isdigit() for name in names for char in name))
+    
+    def test_hash_suffix_without_numbers(self):
+        names = self.check_second_run(SUFFIX_HASH, False)
+        self.assertFalse(any(char.isdigit() for name in names for char in name))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas del camino alternativo de rename_noreplace (sin renameat2)
+Uso: python -m unittest discover -s tests
+"""
+
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rename_folders_core
+from rename_folders_core import DIR_FD_SUPPORTED, rename_noreplace
+
+class RenameNoreplaceFallbackTest(unittest.TestCase):
+    """rename_noreplace con renameat2 marcado como no disponible"""
+    
+    def setUp(self):
+        self.saved = (rename_folders_core._renameat2, rename_folders_core._renameat2_loaded)
+        rename_folders_core._renameat2_loaded = True
+        rename_folders_core._renameat2 = None
+        self.base = tempfile.mkdtemp(prefix='renombrador_test_')
+        os.mkdir(os.path.join(self.base, 'origen'))
+    
+    def tearDown(self):
+        rename_folders_core._renameat2, rename_folders_core._renameat2_loaded = self.saved
+        shutil.rmtree(self.base)
+    
+    def path(self, name):
+        return os.path.join(self.base, name)
+    
+    def test_existing_empty_directory_is_not_replaced(self):
+        os.mkdir(self.path('destino'))
+        with self.assertRaises(FileExistsError) as context:
+            rename_noreplace(self.path('origen'), self.path('destino'))
+        self.assertEqual(context.exception.errno, errno.EEXIST)
+        self.assertTrue(os.path.isdir(self.path('origen')))
+        self.assertTrue(os.path.isdir(self.path('destino')))
+    
+    def test_rename_to_free_name(self):
+        rename_noreplace(self.path('origen'), self.path('destino'))
+        self.assertFalse(os.path.lexists(self.path('origen')))
+        self.assertTrue(os.path.isdir(self.path('destino')))
+    
+    @unittest.skipUnless(DIR_FD_SUPPORTED, "el sistema no admite dir_fd en os.rename")
+    def test_rename_relative_to_dir_fd(self):
+        os.mkdir(self.path('ocupado'))
+        dir_fd = os.open(self.base, os.O_RDONLY)
+        try:
+            with self.assertRaises(FileExistsError):
+                rename_noreplace('origen', 'ocupado', dir_fd=dir_fd)
+            rename_noreplace('origen', 'destino', dir_fd=dir_fd)
+        finally:
+            os.close(dir_fd)
+        self.assertEqual(sorted(os.listdir(self.base)), ['destino', 'ocupado'])
+
+class RenameNoreplaceRejectedFlagTest(unittest.TestCase):
+    """rename_noreplace en un sistema de archivos que rechaza RENAME_NOREPLACE"""
+    
+    def setUp(self):
+        self.saved = (rename_folders_core._renameat2, rename_folders_core._renameat2_loaded,
+                      set(rename_folders_core._renameat2_rejected))
+        self.calls = 0
+        
+        def renameat2(*args):
+            self.calls += 1
+            return -1
+        
+        rename_folders_core._renameat2_loaded = True
+        rename_folders_core._renameat2 = (renameat2, lambda: errno.EINVAL)
+        rename_folders_core._renameat2_rejected.clear()
+        self.base = tempfile.mkdtemp(prefix='renombrador_test_')
+        for name in ('uno', 'dos'):
+            os.mkdir(os.path.join(self.base, name))
+    
+    def tearDown(self):
+        (rename_folders_core._renameat2, rename_folders_core._renameat2_loaded,
+         rejected) = self.saved
+        rename_folders_core._renameat2_rejected.clear()
+        rename_folders_core._renameat2_rejected.update(rejected)
+        shutil.rmtree(self.base)
+    
+    def test_rejection_is_remembered_per_device(self):
+        rename_noreplace(os.path.join(self.base, 'uno'), os.path.join(self.base, 'uno_nuevo'))
+        rename_noreplace(os.path.join(self.base, 'dos'), os.path.join(self.base, 'dos_nuevo'))
+        self.assertEqual(self.calls, 1)
+        self.assertIn(os.stat(self.base).st_dev, rename_folders_core._renameat2_rejected)
+        self.assertEqual(sorted(os.listdir(self.base)), ['dos_nuevo', 'uno_nuevo'])
+
+if __name__ == '__main__':
+    unittest.main()